@@ -1,17 +1,49 @@
 import os
+import gc
 import sqlite3
 import hashlib
+import secrets
 import datetime
 import calendar
 import json
+import threading
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from pathlib import Path
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, abort
 from werkzeug.utils import secure_filename
-from backend import start_run_workflow, upload_pdf, upload_json, get_events
-from ml_service import predict_user_cluster
+from werkzeug.exceptions import RequestEntityTooLarge
+from resilience import Deadline, DeadlineExceeded
+from backend import start_run_workflow, stream_run_workflow, upload_pdf, upload_json, get_events, langflow_health, pdf_to_df
+from ml_service import predict_user_cluster, preload_model, predictor, model_version
+from profiling import RequestProfiler
+from assets import AssetPipeline
+from streaming import RunBroadcaster, RunSuperseded, sse_format
+from singleflight import SingleFlight, workflow_key
+from recommendation_cache import RecommendationCache, profile_fingerprint
+from calendar_export import iter_ics, iter_csv
+from similarity import similarity_index, summarize as summarize_neighbours
+from event_catalog import (
+    ensure_schema as ensure_event_catalog, migrate_legacy_events, upsert_catalog_event,
+    link_user_event, unlink_user_events, prune_catalog, search_events,
+)
 
 app = Flask(__name__)
-app.secret_key = "supersecretkey"  # Replace with a secure key in production
+app.secret_key = os.environ.get("SECRET_KEY", "supersecretkey")  # Set SECRET_KEY in production
+
+# Hard cap on request bodies (PDF uploads); larger requests are rejected with 413
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get("MAX_UPLOAD_MB", 10)) * 1024 * 1024
+
+# Opt-in request profiling (see PROFILING_ENABLED / PROFILE_SAMPLE_RATE / PROFILE_TOKEN)
+profiler = RequestProfiler(app)
+
+# Content-hashed, precompressed static files with immutable caching (asset_url() in templates)
+assets = AssetPipeline(app)
+
+# Stream recommendations to the events page as Langflow generates them (opt-in: every
+# open stream holds a server thread until the run finishes)
+STREAM_RECOMMENDATIONS = os.environ.get("STREAM_RECOMMENDATIONS", "0").lower() in ("1", "true", "yes")
+_stream_start_lock = threading.Lock()
 
 # ---- DATABASE SETUP ----
 # Azure Web Apps persistence logic
@@ -30,6 +62,19 @@ def get_connection():
     conn.row_factory = sqlite3.Row  # Access columns by name
     return conn
 
+# Coalesces identical in-flight workflow runs (threads + worker processes)
+single_flight = SingleFlight(get_connection)
+
+# Streamed recommendation progress, shared by all worker processes through the database
+run_broadcaster = RunBroadcaster(get_connection)
+
+# Users with equivalent profiles share one events workflow result
+recommendation_cache = RecommendationCache(
+    get_connection,
+    ttl_seconds=float(os.environ.get("RECOMMENDATION_CACHE_TTL", 24 * 3600)),
+    max_entries=int(os.environ.get("RECOMMENDATION_CACHE_MAX_ENTRIES", 5000)),
+)
+
 def init_db():
     conn = get_connection()
     c = conn.cursor()
@@ -53,21 +98,81 @@ def init_db():
             FOREIGN KEY(username) REFERENCES users(username)
         )
     """)
+    # Events are stored once in event_catalog and linked to users through user_events
+    ensure_event_catalog(c)
+    # Bumped on every change to a user's events; drives ETags of the calendar exports
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS events_versions (
+            username TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT
+        )
+    """)
+    # Random per-user tokens for calendar feed URLs; rotating one revokes the old URL
     c.execute("""
-        CREATE TABLE IF NOT EXISTS events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            name TEXT,
-            address TEXT,
-            zip TEXT,
-            accessible TEXT,
-            priceless TEXT,
-            date TEXT,
-            text TEXT,
-            relevance_score REAL,
+        CREATE TABLE IF NOT EXISTS feed_tokens (
+            username TEXT PRIMARY KEY,
+            token TEXT NOT NULL UNIQUE,
+            created_at TEXT,
             FOREIGN KEY(username) REFERENCES users(username)
         )
     """)
+    # Lab values extracted from the user's latest PDF (model input for re-classification)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS user_lab_values (
+            username TEXT PRIMARY KEY,
+            Age REAL,
+            BMI REAL,
+            Chol REAL,
+            HDL REAL,
+            LDL REAL,
+            TG REAL,
+            Cr REAL,
+            BUN REAL,
+            updated_at TEXT,
+            FOREIGN KEY(username) REFERENCES users(username)
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS recommendation_cache (
+            fingerprint TEXT PRIMARY KEY,
+            result TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL,
+            hits INTEGER DEFAULT 0
+        )
+    """)
+    # Lease rows used to coalesce duplicate workflow runs across worker processes
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS workflow_runs (
+            key TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            owner TEXT,
+            result TEXT,
+            started_at REAL,
+            heartbeat_at REAL,
+            finished_at REAL
+        )
+    """)
+    # Streamed recommendation runs and the items published so far (streaming.RunBroadcaster)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS stream_runs (
+            run_id TEXT PRIMARY KEY,
+            key TEXT NOT NULL,
+            error TEXT,
+            started_at REAL NOT NULL,
+            finished_at REAL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_stream_runs_key ON stream_runs(key, started_at)")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS stream_run_items (
+            run_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (run_id, seq)
+        )
+    """)
     try:
         c.execute("ALTER TABLE user_profiles ADD COLUMN interests TEXT")
     except sqlite3.OperationalError:
@@ -79,12 +184,33 @@ def init_db():
         pass
         
     conn.commit()
+
+    # One-off move from the old per-user `events` table (see event_catalog.py)
+    migrated = migrate_legacy_events(conn)
+    if migrated:
+        print(f"Migrated legacy events into the catalog: {migrated}")
     conn.close()
 
 # Initialize DB on start
 with app.app_context():
     init_db()
 
+# ---- MODEL SERVING ----
+# Load the classifier at import time. With gunicorn preload_app (see
+# gunicorn.conf.py) this happens once in the master, and forked workers share
+# the model pages copy-on-write instead of each loading a private copy. The
+# warm-up prediction then runs in each worker after the fork (post_fork).
+preload_model()
+# Hot-reload new model bundles (models/CURRENT) without restarting workers.
+# A preloading gunicorn master never serves, so there each worker starts its own (post_fork).
+if not predictor.defer_predictions:
+    predictor.start_watcher()
+# KD-tree over the reference lab dataset, also shared with the workers
+similarity_index.load()
+# Move everything allocated so far out of the GC's tracked generations, so
+# collections in the workers do not touch (and un-share) those pages.
+gc.freeze()
+
 # ---- AUTH HELPERS ----
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
@@ -151,6 +277,38 @@ def load_user_profile(username):
         return dict(row)
     return None
 
+LAB_COLUMNS = ["Age", "BMI", "Chol", "HDL", "LDL", "TG", "Cr", "BUN"]
+
+def save_user_lab_values(username, medical_data):
+    def as_float(value):
+        # pdf_to_df gives NaN/None for tests it could not find
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+        return None if value != value else value
+
+    values = [as_float(medical_data.get(col)) for col in LAB_COLUMNS]
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute(
+        f"""
+        INSERT OR REPLACE INTO user_lab_values (username, {", ".join(LAB_COLUMNS)}, updated_at)
+        VALUES (?, {", ".join("?" for _ in LAB_COLUMNS)}, ?)
+        """,
+        [username] + values + [datetime.datetime.now().isoformat(timespec="seconds")],
+    )
+    conn.commit()
+    conn.close()
+
+def load_user_lab_values(username):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute(f"SELECT {', '.join(LAB_COLUMNS)} FROM user_lab_values WHERE username = ?", (username,))
+    row = c.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
 def user_has_profile(username):
     profile = load_user_profile(username)
     if not profile:
@@ -159,6 +317,73 @@ def user_has_profile(username):
         return False
     return True
 
+def _normalize_event_date(date_str):
+    # Handle different date formats (DD/MM/YYYY vs YYYY-MM-DD)
+    # Try to parse DD/MM/YYYY HH:MM or DD/MM/YYYY
+    try:
+        # Try DD/MM/YYYY HH:MM
+        parsed_date = datetime.datetime.strptime(date_str, "%d/%m/%Y %H:%M")
+        return parsed_date.strftime("%Y-%m-%d")
+    except (ValueError, TypeError):
+        try:
+            # Try DD/MM/YYYY
+            parsed_date = datetime.datetime.strptime(date_str, "%d/%m/%Y")
+            return parsed_date.strftime("%Y-%m-%d")
+        except (ValueError, TypeError):
+            # Fallback to original string if it matches YYYY-MM-DD
+            return date_str
+
+def _event_columns(event):
+    """Map a Langflow event dict to the event catalog columns plus the relevance score."""
+    # Handle 'event_name' vs 'name'
+    return (
+        event.get("name") or event.get("event_name"),
+        event.get("address") or event.get("city"), # Mapping city to address if address is missing
+        event.get("zip"),
+        event.get("accessible"),
+        event.get("priceless"),
+        _normalize_event_date(event.get("date")),
+        event.get("text") or event.get("description"),
+        event.get("relevance_score"),
+    )
+
+def _calendar_event(columns):
+    """Shape a row of event columns the way the calendar templates expect it."""
+    name, address, zip_code, accessible, priceless, date_str, text, relevance = columns
+    return {
+        "name": name or "Event",
+        "date": date_str,
+        "description": text or "",
+        "address": address or "",
+        "zip": zip_code or "",
+        "accessible": accessible or "No",
+        "priceless": priceless or "No",
+        "relevance": relevance
+    }
+
+def _insert_event(c, username, event):
+    """Link one recommended event to the user (adding it to the catalog if new); return it in calendar shape."""
+    columns = _event_columns(event)
+    event_id = upsert_catalog_event(c, columns[:-1])
+    link_user_event(c, username, event_id, columns[-1], columns[:-1])
+    return _calendar_event(columns)
+
+def _bump_events_version(c, username):
+    c.execute("""
+        INSERT INTO events_versions (username, version, updated_at) VALUES (?, 1, ?)
+        ON CONFLICT(username) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+    """, (username, datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")))
+
+def get_events_version(username):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT version, updated_at FROM events_versions WHERE username = ?", (username,))
+    row = c.fetchone()
+    conn.close()
+    if row:
+        return row['version'], row['updated_at']
+    return 0, None
+
 def save_events(username, events_response):
     if not events_response or "recommended_events" not in events_response:
         return
@@ -167,47 +392,46 @@ def save_events(username, events_response):
     c = conn.cursor()
     
     # Optional: Delete old events
-    c.execute("DELETE FROM events WHERE username = ?", (username,))
+    previous_ids = unlink_user_events(c, username)
     
     recommended_events = events_response.get("recommended_events", [])
     for event in recommended_events:
-        # Handle different date formats (DD/MM/YYYY vs YYYY-MM-DD)
-        date_str = event.get("date")
-        
-        # Try to parse DD/MM/YYYY HH:MM or DD/MM/YYYY
-        try:
-             # Try DD/MM/YYYY HH:MM
-            parsed_date = datetime.datetime.strptime(date_str, "%d/%m/%Y %H:%M")
-            date_formatted = parsed_date.strftime("%Y-%m-%d")
-        except (ValueError, TypeError):
-            try:
-                # Try DD/MM/YYYY
-                parsed_date = datetime.datetime.strptime(date_str, "%d/%m/%Y")
-                date_formatted = parsed_date.strftime("%Y-%m-%d")
-            except (ValueError, TypeError):
-                 # Fallback to original string if it matches YYYY-MM-DD
-                 date_formatted = date_str
-
-        # Handle 'event_name' vs 'name'
-        event_name = event.get("name") or event.get("event_name")
-        
-        c.execute("""
-            INSERT INTO events (username, name, address, zip, accessible, priceless, date, text, relevance_score)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            username,
-            event_name,
-            event.get("address") or event.get("city"), # Mapping city to address if address is missing
-            event.get("zip"),
-            event.get("accessible"),
-            event.get("priceless"),
-            date_formatted,
-            event.get("text") or event.get("description"),
-            event.get("relevance_score")
-        ))
+        _insert_event(c, username, event)
+    prune_catalog(c, previous_ids)
+    _bump_events_version(c, username)
     conn.commit()
     conn.close()
 
+def save_events_stream(username, events, run=None):
+    """
+    Same semantics as save_events, but for an iterator of events that arrive one by one:
+    old events are replaced once the first new one arrives, and each event is committed
+    (and yielded back in calendar shape) as soon as it is stored.
+    With a streaming run, every write first checks that the run is still the user's
+    latest one and raises RunSuperseded otherwise, so two runs never mix their events.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    previous_ids = None
+    try:
+        for event in events:
+            c.execute("BEGIN IMMEDIATE")
+            if run is not None and not run.is_current(c):
+                raise RunSuperseded(f"A newer recommendations run started for {username}")
+            if previous_ids is None:
+                previous_ids = unlink_user_events(c, username)
+            stored = _insert_event(c, username, event)
+            _bump_events_version(c, username)
+            conn.commit()
+            yield stored
+    finally:
+        # Also after a failed or superseded stream: drop catalog rows nobody links to any more
+        conn.rollback()
+        if previous_ids:
+            prune_catalog(c, previous_ids)
+            conn.commit()
+        conn.close()
+
 def load_year_events(username, year):
     conn = get_connection()
     c = conn.cursor()
@@ -216,11 +440,13 @@ def load_year_events(username, year):
     
     c.execute(
         """
-        SELECT name, date, text, address, zip, accessible, priceless, relevance_score
-        FROM events
-        WHERE username = ?
-          AND date >= ?
-          AND date < ?
+        SELECT e.name, e.date, e.text, e.address, e.zip, e.accessible, e.priceless, u.relevance_score
+        FROM user_events u
+        JOIN event_catalog e ON e.id = u.event_id
+        WHERE u.username = ?
+          AND e.date >= ?
+          AND e.date < ?
+        ORDER BY e.date, e.id
         """,
         (username, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")),
     )
@@ -258,6 +484,53 @@ def load_year_events(username, year):
         events_by_date[date_str_key].append(event_data)
     return events_by_date
 
+def iter_user_events(username, start=None, end=None, batch_size=500):
+    """Stream a user's events in date order straight from a cursor (start inclusive, end exclusive)."""
+    conn = get_connection()
+    try:
+        sql = """
+            SELECT e.id, e.name, e.date, e.text, e.address, e.zip, e.accessible, e.priceless, u.relevance_score
+            FROM user_events u
+            JOIN event_catalog e ON e.id = u.event_id
+            WHERE u.username = ?
+        """
+        params = [username]
+        if start:
+            sql += " AND e.date >= ?"
+            params.append(start)
+        if end:
+            sql += " AND e.date < ?"
+            params.append(end)
+        sql += " ORDER BY e.date, e.id"
+        c = conn.execute(sql, params)
+        while True:
+            rows = c.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+def search_user_events(username, query, start=None, end=None, accessible=False, priceless=False, limit=20):
+    """
+    Full-text search over a user's events (name, description, address), best matches first.
+    Returns None if the query has no searchable words.
+    """
+    conn = get_connection()
+    try:
+        rows = search_events(conn, username, query, start, end, accessible, priceless, limit)
+    finally:
+        conn.close()
+    if rows is None:
+        return None
+    results = []
+    for row in rows:
+        event = _calendar_event((row['name'], row['address'], row['zip'], row['accessible'],
+                                 row['priceless'], row['date'], row['text'], row['relevance_score']))
+        event["id"] = row['id']
+        results.append(event)
+    return results
+
 def get_events_for_month(username, year, month):
     year_events = load_year_events(username, year)
     month_events = {}
@@ -271,6 +544,163 @@ def get_events_for_month(username, year, month):
     return month_events
 
 
+def run_events_workflow(username, json_data):
+    """
+    Upload the profile, run the events workflow and store the result.
+    Identical concurrent submissions (double-click, second tab, another worker)
+    share one run instead of paying for a second LLM call.
+    Returns (events, shared).
+    """
+    fingerprint = profile_fingerprint(json_data)
+
+    def leader():
+        events = recommendation_cache.get(fingerprint)
+        if events is None:
+            response = upload_json(json_data, f"{username}.json")
+            if not response:
+                return None
+            events = start_run_workflow(f"{username}.json", 'events', response)
+            recommendation_cache.put(fingerprint, events)
+        if events:
+            save_events(username, events)
+        return events
+
+    return single_flight.do(workflow_key(username, 'events', json_data), leader)
+
+def start_streaming_recommendations(username, json_data):
+    """Run the events workflow in the background, storing and broadcasting each event as it arrives."""
+    key = workflow_key(username, 'events', json_data)
+    with _stream_start_lock:
+        # Same profile already streaming in this process: just follow that run
+        current = run_broadcaster.get(username)
+        if current is not None and not current.done and single_flight.in_flight(key):
+            return current
+        run = run_broadcaster.start(username)
+
+    fingerprint = profile_fingerprint(json_data)
+
+    def leader():
+        cached = recommendation_cache.get(fingerprint)
+        if cached is not None:
+            for stored in save_events_stream(username, cached.get("recommended_events", []), run):
+                run.publish(stored)
+            return cached
+
+        response = upload_json(json_data, f"{username}.json")
+        if not response:
+            raise RuntimeError("Profile upload to Langflow returned no response")
+        raw_events = []
+
+        def collect():
+            for event in stream_run_workflow(f"{username}.json", 'events', response):
+                raw_events.append(event)
+                yield event
+
+        for stored in save_events_stream(username, collect(), run):
+            run.publish(stored)
+        result = {"recommended_events": raw_events}
+        recommendation_cache.put(fingerprint, result)
+        return result
+
+    def worker():
+        try:
+            result, shared = single_flight.do(key, leader)
+            if shared and result:
+                # Another worker process did the run (and stored it); replay its events here
+                for event in result.get("recommended_events", []):
+                    run.publish(_calendar_event(_event_columns(event)))
+            run.finish()
+        except RunSuperseded as e:
+            # Nobody follows this run any more (get() returns the newer one)
+            print(f"Streaming run stopped: {e}")
+            run.finish(error=str(e))
+        except Exception as e:
+            print(f"Streaming run failed for {username}: {e}")
+            run.finish(error=str(e))
+
+    threading.Thread(target=worker, name=f"events-stream-{username}", daemon=True).start()
+    return run
+
+
+# ---- PDF PIPELINE ----
+PDF_PIPELINE_DEADLINE = float(os.environ.get("PDF_PIPELINE_DEADLINE", 60))  # seconds the request waits
+PDF_REMOTE_DEADLINE = float(os.environ.get("PDF_REMOTE_DEADLINE", 120))  # upload + injection run, queueing included
+# Separate pools: slow Langflow calls must never hold the threads the user's own classification waits on
+pdf_classify_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("PDF_CLASSIFY_WORKERS", 4)), thread_name_prefix="pdf-classify"
+)
+pdf_remote_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("PDF_REMOTE_WORKERS", 8)), thread_name_prefix="pdf-remote"
+)
+
+class SharedTempFile:
+    """Temp file removed once every holder (upload, parser) is done reading it."""
+
+    def __init__(self, path, holders):
+        self.path = path
+        self._holders = holders
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            self._holders -= 1
+            last = self._holders == 0
+        if last:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+def remote_pdf_injection(pdf_path, filename, pdf_ref, deadline):
+    """
+    Upload the PDF to Langflow and run the injection workflow (result is not needed locally).
+    deadline is a Deadline started at submission, so time spent queued counts against it.
+    """
+    try:
+        if deadline.expired():
+            raise DeadlineExceeded(f"PDF injection for {filename} waited {deadline.seconds:.0f}s in the queue")
+        response = upload_pdf(pdf_path, filename, deadline=deadline.remaining())
+    finally:
+        pdf_ref.release()
+    if response:
+        if deadline.expired():
+            raise DeadlineExceeded(f"PDF injection for {filename} exceeded its {deadline.seconds:.0f}s deadline")
+        start_run_workflow(filename, 'injection', response, deadline=deadline.remaining())
+
+def classify_pdf(username, pdf_path, pdf_ref):
+    """Extract lab values locally, predict and store the new cluster. Returns it, or None if nothing was found."""
+    try:
+        pdf_df = pdf_to_df(pdf_path)
+    finally:
+        pdf_ref.release()
+    if pdf_df.empty:
+        return None
+
+    # Convert to dictionary: {'Chol': 200, 'HDL': 50 ...}
+    medical_data = pdf_df.iloc[0].to_dict()
+    save_user_lab_values(username, medical_data)
+
+    # Predict Cluster
+    new_cluster = predict_user_cluster(medical_data)
+
+    # Update Cluster in DB (preserve other profile fields)
+    current_full = load_user_profile(username) or {}
+    save_user_profile(
+        username,
+        current_full.get('age'),
+        current_full.get('gender'),
+        current_full.get('condition_type'),
+        current_full.get('city'),
+        current_full.get('interests'),
+        new_cluster
+    )
+    return new_cluster
+
+def _log_remote_failure(future):
+    if future.exception() is not None:
+        print(f"PDF remote injection failed: {future.exception()}")
+
+
 # ---- ROUTES ----
 
 @app.route('/')
@@ -372,12 +802,13 @@ def profile():
             }
             
             try:
-                response = upload_json(json_data, f"{user}.json")
-                if response:
-                    events = start_run_workflow(f"{user}.json", 'events', response)
-                    if events:
-                        save_events(user, events)
-                        flash("Τα στοιχεία αποθηκεύτηκαν και ενημερώθηκαν τα events!", "success")
+                if STREAM_RECOMMENDATIONS:
+                    start_streaming_recommendations(user, json_data)
+                    flash("Τα στοιχεία αποθηκεύτηκαν! Τα events εμφανίζονται μόλις δημιουργούνται.", "success")
+                    return redirect(url_for('events', live=1))
+                events, _ = run_events_workflow(user, json_data)
+                if events:
+                    flash("Τα στοιχεία αποθηκεύτηκαν και ενημερώθηκαν τα events!", "success")
             except Exception as e:
                 flash(f"Σφάλμα κατά την επικοινωνία με το backend: {str(e)}", "danger")
                 
@@ -392,45 +823,44 @@ def profile():
                 if file.filename == '':
                     flash("Δεν επιλέχθηκε αρχείο PDF.", "warning")
                 elif file:
+                    # Werkzeug has already spooled the upload; copy it once to a named file the pool
+                    # threads can outlive the request with. Upload and parser share it and read it in chunks
+                    tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
                     try:
                         filename = secure_filename(file.filename)
-                        pdf_bytes = file.read()
-                        response = upload_pdf(pdf_bytes, filename)
-                        if response:
-                            start_run_workflow(filename, 'injection', response)
-                            
-                            # 2. Predict Cluster using PDF Data
-                            from backend import pdf_to_df
-                            try:
-                                pdf_df = pdf_to_df(pdf_bytes)
-                                if not pdf_df.empty:
-                                    # Convert to dictionary: {'Chol': 200, 'HDL': 50 ...}
-                                    medical_data = pdf_df.iloc[0].to_dict()
-                                    
-                                    # Predict Cluster
-                                    new_cluster = predict_user_cluster(medical_data)
-                                    
-                                    # Update Cluster in DB (preserve other profile fields)
-                                    current_full = load_user_profile(user) or {}
-                                    save_user_profile(
-                                        user, 
-                                        current_full.get('age'), 
-                                        current_full.get('gender'), 
-                                        current_full.get('condition_type'), 
-                                        current_full.get('city'), 
-                                        current_full.get('interests'), 
-                                        new_cluster
-                                    )
-                                    
-                                    flash(f"Το PDF αναλύθηκε επιτυχώς! Νέα κατηγορία: {new_cluster}", "success")
-                                else:
-                                    flash("Το PDF αναλύθηκε αλλά δεν βρέθηκαν μετρήσεις για κατηγοριοποίηση.", "warning")
-                            except Exception as parse_err:
-                                print(f"PDF local parse error: {parse_err}")
-                                flash(f"Σφάλμα κατά την εξαγωγή δεδομένων από το PDF: {str(parse_err)}", "warning")
-
+                        with tmp:
+                            file.save(tmp)
                     except Exception as e:
+                        os.unlink(tmp.name)
                         flash(f"Σφάλμα κατά την ανάλυση PDF: {str(e)}", "danger")
+                        return redirect(url_for('profile'))
+
+                    # Remote upload + injection and local parse + prediction run side by side;
+                    # the user only waits for the local result.
+                    pdf_ref = SharedTempFile(tmp.name, holders=2)
+                    # profiler.task: the request's cProfile hook cannot see the pool threads
+                    remote = pdf_remote_pool.submit(
+                        profiler.task(remote_pdf_injection), tmp.name, filename, pdf_ref,
+                        Deadline(PDF_REMOTE_DEADLINE),
+                    )
+                    remote.add_done_callback(_log_remote_failure)
+                    local = pdf_classify_pool.submit(profiler.task(classify_pdf), user, tmp.name, pdf_ref)
+
+                    try:
+                        new_cluster = local.result(timeout=PDF_PIPELINE_DEADLINE)
+                        if new_cluster:
+                            flash(f"Το PDF αναλύθηκε επιτυχώς! Νέα κατηγορία: {new_cluster}", "success")
+                        else:
+                            flash("Το PDF αναλύθηκε αλλά δεν βρέθηκαν μετρήσεις για κατηγοριοποίηση.", "warning")
+                    except FuturesTimeout:
+                        flash("Η ανάλυση του PDF συνεχίζεται. Η νέα κατηγορία θα εμφανιστεί σε λίγο.", "info")
+                    except Exception as parse_err:
+                        print(f"PDF local parse error: {parse_err}")
+                        flash(f"Σφάλμα κατά την εξαγωγή δεδομένων από το PDF: {str(parse_err)}", "warning")
+
+                    # Only report the remote side if it already failed; otherwise it finishes in the background
+                    if remote.done() and remote.exception() is not None:
+                        flash(f"Σφάλμα κατά την ανάλυση PDF: {str(remote.exception())}", "danger")
             return redirect(url_for('profile'))
 
     # Load existing profile
@@ -470,6 +900,9 @@ def events():
         "Σεπτέμβριος", "Οκτώβριος", "Νοέμβριος", "Δεκέμβριος"
     ][month-1]
 
+    # Follow a running recommendation stream (set right after a profile update)
+    live = request.args.get('live') == '1' and run_broadcaster.get(user) is not None
+
     return render_template('events.html', 
                            user=user, 
                            year=year, 
@@ -477,7 +910,206 @@ def events():
                            month_name=month_name,
                            month_days=month_days,
                            month_events=month_events,
-                           today=today)
+                           today=today,
+                           live=live,
+                           feed_token=feed_token(user))
+
+@app.route('/events/stream')
+def events_stream():
+    if 'user' not in session:
+        return redirect(url_for('login'))
+
+    run = run_broadcaster.get(session['user'])
+    if run is None:
+        return Response(sse_format({"error": None}, event="done"), mimetype='text/event-stream')
+
+    def generate():
+        for kind, data in run.follow():
+            if kind == "item":
+                yield sse_format(data)
+            elif kind == "ping":
+                yield sse_format()
+            else:
+                yield sse_format({"error": data}, event="done")
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ---- CALENDAR EXPORT ----
+# Calendar apps cannot log in, so feeds can also be opened with a random per-user token
+def feed_token(username):
+    """The user's feed token, created on first use."""
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO feed_tokens (username, token, created_at) VALUES (?, ?, ?)",
+                (username, secrets.token_urlsafe(32), datetime.datetime.now().isoformat(timespec="seconds")),
+            )
+        return conn.execute("SELECT token FROM feed_tokens WHERE username = ?", (username,)).fetchone()['token']
+    finally:
+        conn.close()
+
+def rotate_feed_token(username):
+    """Replace the user's feed token, so previously shared feed URLs stop working."""
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO feed_tokens (username, token, created_at) VALUES (?, ?, ?)
+                ON CONFLICT(username) DO UPDATE SET token = excluded.token, created_at = excluded.created_at
+                """,
+                (username, secrets.token_urlsafe(32), datetime.datetime.now().isoformat(timespec="seconds")),
+            )
+    finally:
+        conn.close()
+
+def feed_token_user(token):
+    conn = get_connection()
+    try:
+        row = conn.execute("SELECT username FROM feed_tokens WHERE token = ?", (token,)).fetchone()
+    finally:
+        conn.close()
+    return row['username'] if row else None
+
+def _parse_export_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        abort(400, description=f"Invalid date: {value} (expected YYYY-MM-DD)")
+
+@app.route('/events/export.<fmt>')
+def events_export(fmt):
+    if fmt not in ("ics", "csv"):
+        abort(404)
+
+    token = request.args.get('token')
+    if token:
+        user = feed_token_user(token)
+        if user is None:
+            abort(403)
+    elif 'user' in session:
+        user = session['user']
+    else:
+        return redirect(url_for('login'))
+
+    start = _parse_export_date(request.args.get('start'))
+    end = _parse_export_date(request.args.get('end'))
+
+    # Conditional GET: the feed only changes when the user's events version does
+    version, updated_at = get_events_version(user)
+    etag = hashlib.sha256(f"{user}|{version}|{fmt}|{start}|{end}".encode()).hexdigest()[:32]
+    last_modified = datetime.datetime.fromisoformat(updated_at) if updated_at else None
+
+    if request.if_none_match.contains(etag) or (
+        not request.if_none_match and last_modified and request.if_modified_since
+        and last_modified.replace(microsecond=0) <= request.if_modified_since
+    ):
+        response = Response(status=304)
+    else:
+        rows = iter_user_events(user, start, end)
+        if fmt == "ics":
+            response = Response(iter_ics(rows, user), mimetype="text/calendar")
+        else:
+            response = Response(iter_csv(rows), mimetype="text/csv")
+        response.headers["Content-Disposition"] = f'attachment; filename="wellnessai-events.{fmt}"'
+
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+@app.route('/events/feed-token', methods=['POST'])
+def events_feed_token_rotate():
+    if 'user' not in session:
+        return redirect(url_for('login'))
+    rotate_feed_token(session['user'])
+    flash("Δημιουργήθηκε νέος σύνδεσμος συνδρομής. Ο παλιός σύνδεσμος δεν λειτουργεί πλέον.", "info")
+    return redirect(url_for('events'))
+
+# ---- EVENT SEARCH ----
+@app.route('/events/search')
+def events_search():
+    if 'user' not in session:
+        return redirect(url_for('login'))
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Missing query parameter q"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+    except ValueError:
+        limit = 20
+
+    def flag(name):
+        return request.args.get(name, '').lower() in ("1", "true", "yes")
+
+    try:
+        results = search_user_events(
+            session['user'], query,
+            start=_parse_export_date(request.args.get('start')),
+            end=_parse_export_date(request.args.get('end')),
+            accessible=flag('accessible'),
+            priceless=flag('priceless'),
+            limit=limit,
+        )
+    except sqlite3.OperationalError as e:
+        # FTS5 rejects some queries outright ("fts5: syntax error ..."): the client's input, not a crash
+        if "fts5" not in str(e):
+            raise
+        return jsonify({"error": f"Invalid search query: {e}"}), 400
+    return jsonify({"query": query, "results": results or []})
+
+@app.after_request
+def add_model_version_header(response):
+    version = model_version()
+    if version:
+        response.headers['X-Model-Version'] = version
+    return response
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    flash(f"Το αρχείο είναι πολύ μεγάλο (μέγιστο {limit_mb} MB).", "danger")
+    return redirect(url_for('profile'))
+
+@app.route('/health/ready')
+def health_ready():
+    # Readiness: model loaded + warmed up, with load time and memory footprint
+    status = predictor.status()
+    return jsonify(status), (200 if status["loaded"] else 503)
+
+@app.route('/health/langflow')
+def health_langflow():
+    # Circuit breaker, retry budget and latency state for monitoring
+    return jsonify(langflow_health())
+
+@app.route('/health/cache')
+def health_cache():
+    # Cross-user recommendation cache size and hit rate
+    return jsonify(recommendation_cache.stats())
+
+# ---- SIMILAR PROFILES ----
+@app.route('/profile/similar')
+def profile_similar():
+    # Reference profiles closest to the user's latest lab values, with their clusters and interests
+    if 'user' not in session:
+        return redirect(url_for('login'))
+
+    lab_values = load_user_lab_values(session['user'])
+    if not lab_values:
+        return jsonify({"error": "No lab values uploaded yet"}), 404
+    try:
+        k = min(max(int(request.args.get('k', 10)), 1), 50)
+    except ValueError:
+        k = 10
+
+    neighbours = similarity_index.neighbors(lab_values, k)
+    return jsonify({"neighbours": neighbours, "summary": summarize_neighbours(neighbours)})
 
 @app.route('/about')
 def about():
@@ -0,0 +1,116 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+import threading
+from pathlib import Path
+from flask import request, send_from_directory, url_for, abort
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+# ---- CONFIG ----
+# At startup every file under static/ is copied to ASSET_BUILD_DIR under a
+# content-hashed name (css/style.<hash>.css) with .gz/.br siblings, and served
+# from ASSET_URL_PREFIX with a one-year immutable Cache-Control.
+ASSET_BUILD_DIR = os.environ.get("ASSET_BUILD_DIR")  # default: <app root>/static_build
+ASSET_URL_PREFIX = os.environ.get("ASSET_URL_PREFIX", "/assets")
+ASSET_MAX_AGE = int(os.environ.get("ASSET_MAX_AGE", 365 * 24 * 3600))
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".svg", ".json", ".html", ".txt", ".map"}
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+class AssetPipeline:
+    """
+    Fingerprinted, precompressed static assets for a Flask app.
+    Templates call asset_url('css/style.css') instead of url_for('static', ...);
+    because the URL changes whenever the file does, browsers may cache it forever
+    and repeat page loads make no static requests at all.
+    """
+
+    def __init__(self, app=None, build_dir=ASSET_BUILD_DIR, url_prefix=ASSET_URL_PREFIX, max_age=ASSET_MAX_AGE):
+        self.build_dir = Path(build_dir) if build_dir else None
+        self.url_prefix = url_prefix.rstrip("/")
+        self.max_age = max_age
+        self.manifest = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.source_dir = Path(app.static_folder)
+        if self.build_dir is None:
+            self.build_dir = Path(app.root_path) / "static_build"
+        self.build()
+        app.add_url_rule(f"{self.url_prefix}/<path:filename>", "hashed_asset", self.serve)
+        app.jinja_env.globals["asset_url"] = self.url
+
+    # ---- BUILD ----
+    def build(self):
+        """Fingerprint and compress every static file. Existing outputs are reused, so restarts are cheap."""
+        manifest = {}
+        with self._lock:
+            for source in sorted(p for p in self.source_dir.rglob("*") if p.is_file()):
+                logical = source.relative_to(self.source_dir).as_posix()
+                data = source.read_bytes()
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                hashed = f"{logical[:-len(source.suffix)] if source.suffix else logical}.{digest}{source.suffix}"
+                target = self.build_dir / hashed
+
+                self._write(target, data)
+                if source.suffix.lower() in COMPRESSIBLE_SUFFIXES:
+                    self._write_smaller(target.with_name(target.name + ".gz"), data, gzip.compress(data, 9, mtime=0))
+                    if brotli is not None:
+                        self._write_smaller(target.with_name(target.name + ".br"), data,
+                                            brotli.compress(data, quality=11))
+                manifest[logical] = hashed
+            self.manifest = manifest
+        print(f"Built {len(manifest)} static assets into {self.build_dir}"
+              f"{'' if brotli is not None else ' (brotli not installed: gzip only)'}.")
+
+    @staticmethod
+    def _write(target: Path, data: bytes):
+        if target.exists():
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Several workers may build at once; the rename makes each file appear complete
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, target)
+
+    def _write_smaller(self, target: Path, original: bytes, compressed: bytes):
+        if len(compressed) < len(original):
+            self._write(target, compressed)
+
+    # ---- TEMPLATES ----
+    def url(self, filename: str) -> str:
+        hashed = self.manifest.get(filename)
+        if hashed is None:
+            # Not built (e.g. added after startup): plain static URL, normal caching
+            return url_for("static", filename=filename)
+        return url_for("hashed_asset", filename=hashed)
+
+    # ---- SERVING ----
+    def serve(self, filename):
+        path = safe_join(str(self.build_dir), filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+
+        accepted = request.accept_encodings
+        send_name, encoding = filename, None
+        for candidate, suffix in ENCODING_SUFFIXES.items():
+            if accepted[candidate] and (self.build_dir / (filename + suffix)).is_file():
+                send_name, encoding = filename + suffix, candidate
+                break
+
+        response = send_from_directory(self.build_dir, send_name, max_age=self.max_age)
+        # The mimetype must come from the original name, not the .gz/.br variant
+        response.mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Cache-Control"] = f"public, max-age={self.max_age}, immutable"
+        response.vary.add("Accept-Encoding")
+        return response
@@ -1,14 +1,17 @@
+import os
 import requests
 import datetime
 import json
 import uuid
 import re
 import io
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, Iterator, Optional, Union
 
 import pandas as pd
 import pdfplumber
 
+from resilience import ResilientEndpoint, CircuitBreaker, RetryBudget, Deadline, DeadlineExceeded
+
 # =========================
 # CONFIG (HARDCODED)
 # =========================
@@ -28,6 +31,45 @@ TWEAK_FILE_NODE_EVENTS = "File-TeORO"
 
 DEFAULT_TIMEOUT = 60  # seconds
 
+# Debug aid: after each PDF upload, parse the PDF again and write <name>.csv to the working
+# directory. Off by default, since the app already parses every upload (classify_pdf).
+SAVE_DEBUG_CSV = os.environ.get("SAVE_DEBUG_CSV", "0").lower() in ("1", "true", "yes")
+
+# Resilience policies (see resilience.py). Uploads are idempotent, so they may be
+# retried and hedged; runs are expensive LLM calls, so they only get a deadline
+# and the circuit breaker unless HEDGE_RUNS is turned on.
+UPLOAD_DEADLINE = 30      # seconds, including retries/hedges
+RUN_DEADLINE = DEFAULT_TIMEOUT
+HEDGE_UPLOADS = True
+HEDGE_RUNS = False
+# Threads for hedged attempts: two per concurrent caller (gunicorn request threads and the
+# app's remote PDF pool), so uploads never queue for one. Threads are only started on demand.
+HEDGE_POOL_WORKERS = int(os.environ.get(
+    "HEDGE_POOL_WORKERS",
+    2 * (int(os.environ.get("GUNICORN_THREADS", 4)) + int(os.environ.get("PDF_REMOTE_WORKERS", 8))),
+))
+
+files_api = ResilientEndpoint(
+    "files",
+    deadline=UPLOAD_DEADLINE,
+    breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30),
+    retry_budget=RetryBudget(ratio=0.2),
+    max_attempts=3,
+    max_workers=HEDGE_POOL_WORKERS,
+)
+run_api = ResilientEndpoint(
+    "run",
+    deadline=RUN_DEADLINE,
+    breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60),
+    max_attempts=1,
+    max_workers=HEDGE_POOL_WORKERS,
+)
+
+
+def langflow_health() -> dict:
+    """Snapshot of breaker / retry budget / latency state for each Langflow API."""
+    return {"files": files_api.snapshot(), "run": run_api.snapshot()}
+
 ALIASES = {
     "Age":  ["Age", "Ηλικία"],
     "BMI":  ["BMI", "Δείκτης μάζας σώματος"],
@@ -92,14 +134,69 @@ def pdf_to_df(pdf_file: Union[bytes, str]) -> pd.DataFrame:
 # Uploads
 # =========================
 
-def upload_pdf(pdf_bytes: bytes, filename: str) -> dict:
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class MultipartFileStream:
+    """
+    multipart/form-data body for a single file on disk.
+    Iterating it reads the file in chunks (fresh handle per iteration, so
+    retries and hedged attempts can each re-send it), and __len__ lets
+    requests send a Content-Length instead of buffering the whole body.
+    """
+
+    def __init__(self, path: str, filename: str, content_type: str, field: str = "file"):
+        self.path = path
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self._head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("utf-8")
+        self._tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self._head) + os.path.getsize(self.path) + len(self._tail)
+
+    def __iter__(self):
+        yield self._head
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        yield self._tail
+
+
+def upload_pdf(pdf_file: Union[bytes, str], filename: str, deadline: Optional[float] = None) -> dict:
     """
     Upload a PDF to Langflow Files API.
+    pdf_file is either the PDF bytes or a path to it on disk (streamed in chunks).
+    deadline (seconds) can only shorten UPLOAD_DEADLINE.
     Returns the JSON response (dict) which should contain a "path".
     """
-    files = {"file": (filename, pdf_bytes, "application/pdf")}
+    if isinstance(pdf_file, bytes):
+        files = {"file": (filename, pdf_file, "application/pdf")}
 
-    resp = requests.post(FILES_ENDPOINT, headers=headers, files=files, timeout=DEFAULT_TIMEOUT)
+        def post(timeout):
+            return requests.post(FILES_ENDPOINT, headers=headers, files=files, timeout=timeout)
+    else:
+        body = MultipartFileStream(pdf_file, filename, "application/pdf")
+
+        def post(timeout):
+            return requests.post(
+                FILES_ENDPOINT,
+                headers={**headers, "Content-Type": body.content_type},
+                data=body,
+                timeout=timeout,
+            )
+
+    resp = files_api.call(
+        post, idempotent=True, hedge=HEDGE_UPLOADS,
+        deadline=min(UPLOAD_DEADLINE, deadline) if deadline is not None else None,
+    )
     if resp.status_code not in (200, 201):
         raise RuntimeError(f"Upload PDF failed ({resp.status_code}): {resp.text[:500]}")
 
@@ -112,13 +209,14 @@ def upload_pdf(pdf_bytes: bytes, filename: str) -> dict:
         )
 
     # optional debug: save extracted CSV locally
-    try:
-        df = pdf_to_df(pdf_bytes)
-        csv_name = filename.replace(".pdf", ".csv")
-        df.to_csv(csv_name, index=False)
-        print(f"[debug] CSV saved: {csv_name}")
-    except Exception as e:
-        print(f"[debug] Failed to convert PDF to CSV: {e}")
+    if SAVE_DEBUG_CSV:
+        try:
+            df = pdf_to_df(pdf_file)
+            csv_name = filename.replace(".pdf", ".csv")
+            df.to_csv(csv_name, index=False)
+            print(f"[debug] CSV saved: {csv_name}")
+        except Exception as e:
+            print(f"[debug] Failed to convert PDF to CSV: {e}")
 
     return out
 
@@ -135,7 +233,11 @@ def upload_json(json_data: Union[bytes, dict], filename: str) -> dict:
 
     files = {"file": (filename, json_bytes, "application/json")}
 
-    resp = requests.post(FILES_ENDPOINT, headers=headers, files=files, timeout=DEFAULT_TIMEOUT)
+    resp = files_api.call(
+        lambda timeout: requests.post(FILES_ENDPOINT, headers=headers, files=files, timeout=timeout),
+        idempotent=True,
+        hedge=HEDGE_UPLOADS,
+    )
     if resp.status_code not in (200, 201):
         raise RuntimeError(f"Upload JSON failed ({resp.status_code}): {resp.text[:500]}")
 
@@ -169,33 +271,122 @@ def _get_file_path(upload_response: Any) -> str:
     raise ValueError(f"Could not find file path in upload_response: {str(upload_response)[:500]}")
 
 
+_JSON_DECODER = json.JSONDecoder()
+
+# Where the output text lives inside a Langflow run response (tried in order).
+LANGFLOW_TEXT_PATHS = [
+    ("outputs", 0, "outputs", 0, "results", "text", "data", "text"),
+    ("outputs", 0, "outputs", 0, "outputs", "text", "message"),
+    ("outputs", 0, "outputs", 0, "artifacts", "text", "raw"),
+]
+
+RECOMMENDED_EVENTS_KEY = '"recommended_events"'
+
+
+def _dig(obj: Any, path: tuple) -> Any:
+    """Follow a path of dict keys / list indexes, returning None on any miss."""
+    for key in path:
+        if isinstance(key, int):
+            if not isinstance(obj, list) or len(obj) <= key:
+                return None
+            obj = obj[key]
+        else:
+            if not isinstance(obj, dict):
+                return None
+            obj = obj.get(key)
+        if obj is None:
+            return None
+    return obj
+
+
+def _is_expected_payload(value: Any) -> bool:
+    """Shapes a workflow answer can have: the events object, or a bare list of items."""
+    return isinstance(value, list) or (isinstance(value, dict) and "recommended_events" in value)
+
+
+def _scan_json_value(s: str, start: int = 0) -> Optional[Union[dict, list]]:
+    """
+    Return the first JSON object/array in s[start:] that has an expected payload shape.
+    Jumps between '{' / '[' candidates with str.find and lets
+    JSONDecoder.raw_decode parse in place, so no regex backtracking and
+    no substring copies. A candidate that fails to decode is skipped up to the
+    point where decoding failed: objects nested inside a truncated or invalid
+    outer value are fragments of it, not the answer.
+    """
+    n = len(s)
+    i = start
+    while i < n:
+        brace = s.find("{", i)
+        bracket = s.find("[", i)
+        if brace < 0 and bracket < 0:
+            return None
+        if brace < 0 or (0 <= bracket < brace):
+            i = bracket
+        else:
+            i = brace
+        try:
+            value, end = _JSON_DECODER.raw_decode(s, i)
+        except RecursionError:
+            # Nesting deeper than the recursion limit: garbage, not a workflow answer
+            return None
+        except ValueError as e:
+            i = max(getattr(e, "pos", i), i + 1)
+            continue
+        if _is_expected_payload(value):
+            return value
+        i = end
+    return None
+
+
+def _recommended_events_fast_path(s: str) -> Optional[dict]:
+    """
+    Schema-aware shortcut for the events workflow: jump straight to the object
+    that owns the "recommended_events" key instead of scanning from the start.
+    """
+    key_pos = s.find(RECOMMENDED_EVENTS_KEY)
+    if key_pos < 0:
+        return None
+    obj_start = s.rfind("{", 0, key_pos)
+    if obj_start < 0:
+        return None
+    try:
+        value, _ = _JSON_DECODER.raw_decode(s, obj_start)
+    except (ValueError, RecursionError):
+        return None
+    if isinstance(value, dict) and isinstance(value.get("recommended_events"), list):
+        return value
+    return None
+
+
 def _safe_json_from_text(text: str) -> Optional[Union[dict, list]]:
     """
     Try to parse JSON from:
     - raw string
     - fenced ```json ... ```
-    - first {...} or [...] block inside text
+    - first {...} or [...] block inside text with the expected shape
+      (see _is_expected_payload); None if there is none
     """
-    if not text or not str(text).strip():
+    if not text:
         return None
 
     s = str(text).strip()
-    s = re.sub(r"```(?:json)?", "", s, flags=re.IGNORECASE).replace("```", "").strip()
+    if not s:
+        return None
 
-    try:
-        return json.loads(s)
-    except Exception:
-        pass
+    # Whole string is JSON (fences included: they are skipped by the scanner)
+    if s[0] in "{[":
+        try:
+            value, end = _JSON_DECODER.raw_decode(s)
+            if end == len(s):
+                return value
+        except (ValueError, RecursionError):
+            pass
 
-    m = re.search(r"(\{.*\}|\[.*\])", s, flags=re.DOTALL)
-    if not m:
-        return None
+    fast = _recommended_events_fast_path(s)
+    if fast is not None:
+        return fast
 
-    candidate = m.group(1).strip()
-    try:
-        return json.loads(candidate)
-    except Exception:
-        return None
+    return _scan_json_value(s)
 
 
 def extract_json_from_langflow(response: dict) -> dict:
@@ -204,20 +395,10 @@ def extract_json_from_langflow(response: dict) -> dict:
     Returns {} if not found/parseable.
     """
     text_block = None
-
-    candidate_paths = [
-        lambda r: r["outputs"][0]["outputs"][0]["results"]["text"]["data"]["text"],
-        lambda r: r["outputs"][0]["outputs"][0]["outputs"]["text"]["message"],
-        lambda r: r["outputs"][0]["outputs"][0]["artifacts"]["text"]["raw"],
-    ]
-
-    for getter in candidate_paths:
-        try:
-            text_block = getter(response)
-            if text_block:
-                break
-        except Exception:
-            continue
+    for path in LANGFLOW_TEXT_PATHS:
+        text_block = _dig(response, path)
+        if text_block:
+            break
 
     if text_block is None:
         return {}
@@ -274,7 +455,8 @@ def list_flows() -> Any:
 # Run flow (tries multiple endpoint layouts)
 # =========================
 
-def start_run_workflow(filename: str, workflow_type: str, upload_response: Optional[dict] = None) -> dict:
+def _build_run_request(upload_response: Optional[dict], workflow_type: str, stream: bool):
+    """Resolve flow id + tweaks and build (payload, endpoint candidates) for the run API."""
     if not upload_response:
         raise ValueError("upload_response is required to get the file path")
 
@@ -297,31 +479,61 @@ def start_run_workflow(filename: str, workflow_type: str, upload_response: Optio
         "tweaks": {file_node: {"path": [file_path]}},
     }
 
+    stream_flag = "true" if stream else "false"
     base = LANGFLOW_BASE_URL.rstrip("/")
     api_root_candidates = [base, base + "/api"] if not base.endswith("/api") else [base, base[:-4]]
 
     endpoint_candidates = []
     for api_root in api_root_candidates:
         if api_root.endswith("/api"):
-            endpoint_candidates.append(f"{api_root}/v1/run/{workflow_id}?stream=false")
-            endpoint_candidates.append(f"{api_root}/v1/run/{workflow_id}/?stream=false")
+            endpoint_candidates.append(f"{api_root}/v1/run/{workflow_id}?stream={stream_flag}")
+            endpoint_candidates.append(f"{api_root}/v1/run/{workflow_id}/?stream={stream_flag}")
         else:
-            endpoint_candidates.append(f"{api_root}/api/v1/run/{workflow_id}?stream=false")
-            endpoint_candidates.append(f"{api_root}/api/v1/run/{workflow_id}/?stream=false")
+            endpoint_candidates.append(f"{api_root}/api/v1/run/{workflow_id}?stream={stream_flag}")
+            endpoint_candidates.append(f"{api_root}/api/v1/run/{workflow_id}/?stream={stream_flag}")
+
+    return payload, endpoint_candidates
+
+
+def _non_json_run_error(last_info: Optional[str]) -> RuntimeError:
+    return RuntimeError(
+        "Langflow returned NON-JSON response for all run endpoint candidates.\n"
+        f"Last: {last_info}\n\n"
+        "Αυτό συνήθως σημαίνει:\n"
+        "1) λάθος flow id (WORKFLOW_ID_*) ή\n"
+        "2) το API δεν είναι exposed στο συγκεκριμένο domain/path.\n\n"
+        "Δοκίμασε να τρέξεις:\n"
+        "  from backend import list_flows\n"
+        "  flows = list_flows(); print(flows)\n"
+        "και πάρε το σωστό flow id."
+    )
+
+
+def start_run_workflow(filename: str, workflow_type: str, upload_response: Optional[dict] = None,
+                       deadline: Optional[float] = None) -> dict:
+    """deadline (seconds) bounds the whole call, across every endpoint candidate."""
+    payload, endpoint_candidates = _build_run_request(upload_response, workflow_type, stream=False)
 
     last_info = None
+    overall = Deadline(deadline) if deadline is not None else None
 
     for url in endpoint_candidates:
-        resp = requests.post(
-            url,
-            headers={
-                "x-api-key": LANGFLOW_API_KEY,
-                "Content-Type": "application/json",
-                "accept": "application/json",
-            },
-            json=payload,
-            timeout=DEFAULT_TIMEOUT,
-            allow_redirects=False,
+        if overall is not None and overall.expired():
+            raise DeadlineExceeded(f"Run {workflow_type} exceeded its {deadline:.0f}s deadline. Last: {last_info}")
+        resp = run_api.call(
+            lambda timeout, url=url: requests.post(
+                url,
+                headers={
+                    "x-api-key": LANGFLOW_API_KEY,
+                    "Content-Type": "application/json",
+                    "accept": "application/json",
+                },
+                json=payload,
+                timeout=timeout,
+                allow_redirects=False,
+            ),
+            hedge=HEDGE_RUNS,
+            deadline=min(RUN_DEADLINE, overall.remaining()) if overall is not None else None,
         )
 
         ct = (resp.headers.get("content-type") or "").lower()
@@ -343,17 +555,167 @@ def start_run_workflow(filename: str, workflow_type: str, upload_response: Optio
         # κάτι άλλο -> συνέχισε
         continue
 
-    raise RuntimeError(
-        "Langflow returned NON-JSON response for all run endpoint candidates.\n"
-        f"Last: {last_info}\n\n"
-        "Αυτό συνήθως σημαίνει:\n"
-        "1) λάθος flow id (WORKFLOW_ID_*) ή\n"
-        "2) το API δεν είναι exposed στο συγκεκριμένο domain/path.\n\n"
-        "Δοκίμασε να τρέξεις:\n"
-        "  from backend import list_flows\n"
-        "  flows = list_flows(); print(flows)\n"
-        "και πάρε το σωστό flow id."
-    )
+    raise _non_json_run_error(last_info)
+
+# =========================
+# Streaming run: yield events as soon as each one is complete
+# =========================
+
+class IncrementalEventParser:
+    """
+    Incrementally pulls complete objects out of the "recommended_events" array
+    of a JSON document that arrives token by token.
+    Only retries a decode when a closing brace has arrived since the last try.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.cursor = None  # position inside the array, once found
+        self.finished = False
+        self._pending_close = False
+
+    def feed(self, chunk: str) -> list:
+        if self.finished or not chunk:
+            return []
+        self.buffer += chunk
+        if "}" in chunk or "]" in chunk:
+            self._pending_close = True
+        return self._drain()
+
+    def _drain(self) -> list:
+        if self.cursor is None:
+            key_pos = self.buffer.find(RECOMMENDED_EVENTS_KEY)
+            if key_pos < 0:
+                return []
+            array_pos = self.buffer.find("[", key_pos + len(RECOMMENDED_EVENTS_KEY))
+            if array_pos < 0:
+                return []
+            self.cursor = array_pos + 1
+
+        if not self._pending_close:
+            return []
+        self._pending_close = False
+
+        out = []
+        s = self.buffer
+        n = len(s)
+        while True:
+            i = self.cursor
+            while i < n and s[i] in " \t\r\n,":
+                i += 1
+            if i >= n:
+                self.cursor = i
+                break
+            if s[i] == "]":
+                self.finished = True
+                break
+            if s[i] != "{":
+                # Unexpected content; leave it to the final full-text parse
+                self.finished = True
+                break
+            try:
+                event, end = _JSON_DECODER.raw_decode(s, i)
+            except ValueError:
+                self.cursor = i  # incomplete object, wait for more tokens
+                break
+            self.cursor = end
+            if isinstance(event, dict):
+                out.append(event)
+        return out
+
+
+def _iter_stream_messages(resp) -> Iterator[dict]:
+    """Yield decoded JSON messages from a Langflow streaming response (NDJSON or SSE framing)."""
+    for raw_line in resp.iter_lines(decode_unicode=True):
+        if not raw_line:
+            continue
+        line = raw_line.strip()
+        if line.startswith("data:"):
+            line = line[5:].strip()
+        if not line or line[0] != "{":
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+
+def stream_run_workflow(filename: str, workflow_type: str, upload_response: Optional[dict] = None) -> Iterator[dict]:
+    """
+    Run a workflow with stream=true and yield each recommended event (dict)
+    as soon as its JSON object is complete in the token stream.
+    If the flow does not stream tokens, events are yielded from the final result.
+    """
+    payload, endpoint_candidates = _build_run_request(upload_response, workflow_type, stream=True)
+
+    last_info = None
+
+    for url in endpoint_candidates:
+        # The deadline bounds the time to the first response byte; the read timeout
+        # then applies between chunks, so long generations are not cut off.
+        resp = run_api.call(
+            lambda timeout, url=url: requests.post(
+                url,
+                headers={
+                    "x-api-key": LANGFLOW_API_KEY,
+                    "Content-Type": "application/json",
+                    "accept": "text/event-stream, application/x-ndjson, application/json",
+                },
+                json=payload,
+                timeout=timeout,
+                allow_redirects=False,
+                stream=True,
+            ),
+        )
+
+        with resp:
+            ct = (resp.headers.get("content-type") or "").lower()
+            last_info = f"url={url} status={resp.status_code} ct={ct}"
+
+            if "text/html" in ct or resp.status_code >= 400:
+                continue
+
+            # Server ignored stream=true and answered with the full run response
+            if "application/json" in ct:
+                try:
+                    body = resp.json()
+                except Exception as e:
+                    raise RuntimeError(f"Run returned application/json but json() failed: {e}")
+                for event in extract_json_from_langflow(body).get("recommended_events", []):
+                    if isinstance(event, dict):
+                        yield event
+                return
+
+            if "event-stream" not in ct and "ndjson" not in ct:
+                continue
+
+            parser = IncrementalEventParser()
+            yielded = 0
+            for message in _iter_stream_messages(resp):
+                kind = message.get("event")
+                data = message.get("data") or {}
+                if kind == "token":
+                    for event in parser.feed(data.get("chunk") or ""):
+                        yielded += 1
+                        yield event
+                elif kind == "end":
+                    final = extract_json_from_langflow(data.get("result") or {})
+                    break
+                elif kind == "error":
+                    raise RuntimeError(f"Langflow stream error: {str(data)[:500]}")
+            else:
+                final = {}
+
+            # Emit whatever the incremental parser could not (non-streaming LLM node, odd formatting)
+            if not final and parser.buffer:
+                parsed = _safe_json_from_text(parser.buffer)
+                final = parsed if isinstance(parsed, dict) else {}
+            for event in (final.get("recommended_events") or [])[yielded:]:
+                if isinstance(event, dict):
+                    yield event
+            return
+
+    raise _non_json_run_error(last_info)
 
 # =========================
 # Optional local stub: events generator
@@ -0,0 +1,80 @@
+"""
+Storage benchmark: per-user `events` rows vs. the shared event catalog.
+Builds a synthetic database in the old layout (many users recommended the same
+city events), migrates it with event_catalog.migrate_legacy_events and compares
+file size and a calendar query before and after.
+
+    python benchmarks/bench_event_catalog.py
+"""
+
+import os
+import sys
+import random
+import sqlite3
+import tempfile
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from event_catalog import migrate_legacy_events, db_size  # noqa: E402
+
+LEGACY_SCHEMA = """
+    CREATE TABLE events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        name TEXT, address TEXT, zip TEXT, accessible TEXT, priceless TEXT,
+        date TEXT, text TEXT, relevance_score REAL
+    )
+"""
+
+
+def build_legacy_db(path, n_users, n_catalog, per_user):
+    rng = random.Random(42)
+    pool = [
+        (f"Event {i}", "Αθήνα", "10558", "Yes", "No", f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}",
+         "Περιγραφή δραστηριότητας " * 20)
+        for i in range(n_catalog)
+    ]
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+    conn.execute("CREATE INDEX idx_events_user_date ON events(username, date)")
+    with conn:
+        for u in range(n_users):
+            conn.executemany(
+                "INSERT INTO events (username, name, address, zip, accessible, priceless, date, text, relevance_score) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(f"user{u}", *event, round(rng.random(), 2)) for event in rng.sample(pool, per_user)],
+            )
+    conn.execute("VACUUM")
+    return conn
+
+
+def time_query(conn, sql, number=200):
+    return timeit.timeit(lambda: conn.execute(sql, ("user7", "2025-01-01", "2026-01-01")).fetchall(),
+                         number=number) / number
+
+
+def main():
+    cases = [(1000, 200, 30), (5000, 500, 50)]
+    for n_users, n_catalog, per_user in cases:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = build_legacy_db(os.path.join(tmp, "bench.db"), n_users, n_catalog, per_user)
+            before = db_size(conn)
+            t_before = time_query(conn, "SELECT * FROM events WHERE username = ? AND date >= ? AND date < ?")
+            stats = migrate_legacy_events(conn)
+            conn.execute("VACUUM")
+            after = db_size(conn)
+            t_after = time_query(conn, """
+                SELECT e.*, u.relevance_score FROM user_events u JOIN event_catalog e ON e.id = u.event_id
+                WHERE u.username = ? AND e.date >= ? AND e.date < ?
+            """)
+            conn.close()
+        print(
+            f"users={n_users:<5} rows={stats['migrated_rows']:<7} catalog={stats['catalog_events']:<4}  "
+            f"size {before / 1024 / 1024:7.2f} MiB -> {after / 1024 / 1024:6.2f} MiB  "
+            f"year query {t_before * 1000:.3f} ms -> {t_after * 1000:.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
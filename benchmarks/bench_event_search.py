@@ -0,0 +1,86 @@
+"""
+Latency benchmark: FTS5 event search (event_catalog.search_events) against the
+previous option of loading a user's events and matching them in Python.
+
+    python benchmarks/bench_event_search.py [n_events]
+"""
+
+import os
+import sys
+import random
+import sqlite3
+import tempfile
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from event_catalog import (  # noqa: E402
+    ensure_schema, upsert_catalog_event, link_user_event, search_events, normalize_search_text,
+)
+
+ACTIVITIES = ["Γιόγκα", "πεζοπορία", "κολύμβηση", "χορός", "συναυλία", "έκθεση", "μαγειρική", "ποδηλασία",
+              "yoga", "running", "θέατρο", "σινεμά", "διαλογισμός", "τένις", "βόλεϊ", "αγορά"]
+CITIES = ["Αθήνα", "Θεσσαλονίκη", "Πάτρα", "Ηράκλειο", "Λάρισα"]
+# Description vocabulary with a Zipf-like frequency distribution, like real text
+VOCABULARY = [f"λέξη{i}" for i in range(5000)]
+VOCABULARY_WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+QUERIES = [("γιογκα", {}), ("πεζο*", {}), ("συναυλια αθηνα", {"accessible": True}),
+           ("χορ*", {"start": "2025-03-01", "end": "2025-06-01", "priceless": True}),
+           ("λεξη3", {}), ("λεξη1234", {}), ("λεξη12*", {"accessible": True})]
+
+
+def build_db(path, n_events, n_users, per_user):
+    rng = random.Random(7)
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    ensure_schema(c)
+    with conn:
+        catalog = {}
+        for i in range(n_events):
+            activity = rng.choice(ACTIVITIES)
+            description = " ".join(rng.choices(VOCABULARY, VOCABULARY_WEIGHTS, k=40))
+            columns = (
+                f"{activity} {i}", rng.choice(CITIES), "10558", rng.choice(["Yes", "No"]), rng.choice(["Yes", "No"]),
+                f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                f"{activity} για όλους. {description}",
+            )
+            catalog[upsert_catalog_event(c, columns)] = columns
+        ids = list(catalog)
+        for u in range(n_users):
+            for event_id in rng.sample(ids, per_user):
+                link_user_event(c, f"user{u}", event_id, round(rng.random(), 2), catalog[event_id])
+    return conn
+
+
+def python_scan(conn, username, query, start=None, end=None, accessible=False, priceless=False):
+    """Baseline: pull every event of the user and filter in Python."""
+    terms = normalize_search_text(query).replace("*", "").split()
+    rows = conn.execute("""
+        SELECT e.name, e.address, e.text, e.date, e.accessible, e.priceless
+        FROM user_events u JOIN event_catalog e ON e.id = u.event_id WHERE u.username = ?
+    """, (username,)).fetchall()
+    hits = []
+    for name, address, text, date, is_accessible, is_priceless in rows:
+        haystack = normalize_search_text(f"{name} {address} {text}")
+        if all(t in haystack for t in terms) and (not start or date >= start) and (not end or date < end) \
+                and (not accessible or is_accessible == "Yes") and (not priceless or is_priceless == "Yes"):
+            hits.append((name, date))
+    return hits
+
+
+def main():
+    n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build_db(os.path.join(tmp, "bench.db"), n_events, n_users=2000, per_user=150)
+        print(f"{n_events} catalog events, 2000 users x 150 linked events")
+        for query, filters in QUERIES:
+            number = 50
+            fts = timeit.timeit(lambda: search_events(conn, "user3", query, **filters), number=number) / number
+            scan = timeit.timeit(lambda: python_scan(conn, "user3", query, **filters), number=5) / 5
+            print(f"  {query!r:<22} {str(filters):<62} fts={fts * 1000:7.2f} ms  "
+                  f"python scan={scan * 1000:8.2f} ms  hits={len(search_events(conn, 'user3', query, limit=1000, **filters))}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
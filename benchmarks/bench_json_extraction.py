@@ -0,0 +1,73 @@
+"""
+Micro-benchmark: JSON extraction from large synthetic Langflow outputs.
+Compares the previous regex-based extractor with backend._safe_json_from_text.
+
+    python benchmarks/bench_json_extraction.py
+"""
+
+import re
+import sys
+import json
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from backend import _safe_json_from_text  # noqa: E402
+
+
+def legacy_safe_json_from_text(text):
+    s = str(text).strip()
+    s = re.sub(r"```(?:json)?", "", s, flags=re.IGNORECASE).replace("```", "").strip()
+    try:
+        return json.loads(s)
+    except Exception:
+        pass
+    m = re.search(r"(\{.*\}|\[.*\])", s, flags=re.DOTALL)
+    if not m:
+        return None
+    try:
+        return json.loads(m.group(1).strip())
+    except Exception:
+        return None
+
+
+def make_payload(n_events: int, noise_lines: int) -> str:
+    events = [
+        {
+            "name": f"Event {i}",
+            "address": "Αθήνα",
+            "zip": "10558",
+            "accessible": "Yes",
+            "priceless": "No",
+            "date": "12/05/2025 18:00",
+            "text": "Περιγραφή δραστηριότητας " * 10,
+            "relevance_score": 0.5,
+        }
+        for i in range(n_events)
+    ]
+    noise = "\n".join(f"Thinking step {i}: consider {{city}} and [interests] ..." for i in range(noise_lines))
+    body = json.dumps({"recommended_events": events}, ensure_ascii=False)
+    return f"{noise}\n```json\n{body}\n```\nNote: {{done}} and trailing }} braces"
+
+
+def main():
+    cases = [
+        ("small", make_payload(10, 10)),
+        ("medium", make_payload(200, 500)),
+        ("large", make_payload(2000, 5000)),
+    ]
+    for label, payload in cases:
+        new = _safe_json_from_text(payload)
+        old = legacy_safe_json_from_text(payload)
+        number = 20
+        t_new = timeit.timeit(lambda: _safe_json_from_text(payload), number=number) / number
+        t_old = timeit.timeit(lambda: legacy_safe_json_from_text(payload), number=number) / number
+        print(
+            f"{label:<7} size={len(payload) / 1024:8.1f} KiB  "
+            f"legacy={t_old * 1000:8.2f} ms ({'ok' if isinstance(old, dict) else 'FAIL'})  "
+            f"scanner={t_new * 1000:8.2f} ms ({'ok' if isinstance(new, dict) else 'FAIL'})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Latency benchmark: KD-tree nearest reference profiles (similarity.SimilarityIndex)
+against a brute-force scan over the same standardized reference matrix.
+
+    python benchmarks/bench_similarity.py [n_queries]
+"""
+
+import os
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from similarity import SimilarityIndex, FEATURES  # noqa: E402
+
+
+def brute_force(reference, queries, k):
+    """Full distance matrix + partial sort, i.e. what the tree avoids."""
+    d2 = ((queries[:, None, :] - reference[None, :, :]) ** 2).sum(axis=2)
+    idx = np.argpartition(d2, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(d2, idx, axis=1).argsort(axis=1)
+    return np.take_along_axis(idx, order, axis=1)
+
+
+def main():
+    n_queries = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    k = 5
+    os.chdir(ROOT)
+    index = SimilarityIndex()
+    if not index.load():
+        return 1
+
+    reference_df = pd.read_csv(index.csv_path)
+    reference = index.transform(reference_df)
+    rng = np.random.default_rng(0)
+    # Perturbed reference rows as stand-ins for pdf_to_df outputs
+    sample = reference_df[FEATURES].sample(n_queries, replace=True, random_state=0).reset_index(drop=True)
+    queries_df = sample * rng.normal(1.0, 0.05, size=sample.shape)
+    queries = index.transform(queries_df)
+
+    _, tree_idx = index.tree.query(queries, k=k)
+    brute_idx = brute_force(reference, queries, k)
+    agree = np.mean([set(a) == set(b) for a, b in zip(tree_idx, brute_idx)])
+    print(f"{len(reference)} reference profiles, {n_queries} queries, k={k}; same neighbours: {agree:.1%}")
+
+    single_row = queries_df.head(1)
+    single_dict = single_row.iloc[0].to_dict()
+    cases = [
+        ("tree, one row (neighbors, dict)", lambda: index.neighbors(single_dict, k), 1, 500),
+        ("tree, one row (neighbors, frame)", lambda: index.neighbors(single_row, k), 1, 500),
+        ("brute, one row", lambda: brute_force(reference, queries[:1], k), 1, 500),
+        ("tree, batch (neighbors_batch)", lambda: index.neighbors_batch(queries_df, k), n_queries, 5),
+        ("tree, batch (raw query)", lambda: index.tree.query(queries, k=k), n_queries, 5),
+        ("brute, batch", lambda: brute_force(reference, queries, k), n_queries, 5),
+    ]
+    for label, fn, rows, number in cases:
+        per_call = timeit.timeit(fn, number=number) / number
+        print(f"  {label:<32} {per_call * 1000:9.3f} ms/call  {per_call / rows * 1e6:9.1f} µs/lookup")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""
+Bulk ingestion of lab-report PDFs (e.g. a partner clinic onboarding a cohort).
+
+Walks a directory (recursively) or a .zip/.tar(.gz) archive of PDFs, extracts
+lab values in parallel across cores with backend.extract_kv_from_pdf, writes
+one typed table, scores every row with a single batched prediction and can
+upsert the results into the database.
+
+Examples:
+    python bulk_ingest.py reports/ -o cohort.csv
+    python bulk_ingest.py clinic_batch.zip -o cohort.csv --workers 8
+    python bulk_ingest.py reports/ -o cohort.csv --upsert --username-map mapping.csv
+"""
+
+import os
+import sys
+import csv
+import time
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import zipfile
+import argparse
+import datetime
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from backend import ALIASES, extract_kv_from_pdf
+
+DEFAULT_DB_PATH = os.environ.get("DB_PATH", "users.db")
+LAB_COLUMNS = list(ALIASES.keys())
+
+
+# ---- INPUT DISCOVERY ----
+
+def discover(source: str, workdir: str) -> list:
+    """
+    Return (path, member, name) tasks: member is the zip member to read from path, or None
+    when path is the PDF itself. Tar members are unpacked into workdir first.
+    """
+    path = Path(source)
+    if path.is_dir():
+        return [(str(p), None, str(p)) for p in sorted(path.rglob("*")) if p.is_file() and p.suffix.lower() == ".pdf"]
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            return [(str(path), n, n) for n in sorted(zf.namelist()) if n.lower().endswith(".pdf")]
+    if tarfile.is_tarfile(path):
+        return _unpack_tar(path, workdir)
+    if path.suffix.lower() == ".pdf":
+        return [(str(path), None, str(path))]
+    raise ValueError(f"{source} is not a directory, archive or PDF")
+
+
+def _unpack_tar(path: Path, workdir: str) -> list:
+    """
+    Copy every PDF member to a temp file in one sequential pass. A .tar.gz has no index, so
+    reading members separately would decompress the archive again for every file.
+    """
+    tasks = []
+    with tarfile.open(path, "r|*") as tf:
+        for m in tf:
+            if not (m.isfile() and m.name.lower().endswith(".pdf")):
+                continue
+            target = os.path.join(workdir, f"{len(tasks):06d}.pdf")
+            with tf.extractfile(m) as src, open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            tasks.append((target, None, m.name))
+    return tasks
+
+
+def _read_member(source: str, member: str) -> bytes:
+    # Zip has a central directory, so each worker can seek straight to its member
+    with zipfile.ZipFile(source) as zf:
+        return zf.read(member)
+
+
+# ---- WORKER ----
+
+def extract_one(task):
+    """Runs in a worker process. Returns (name, values, error, seconds)."""
+    source, member, name = task
+    started = time.perf_counter()
+    try:
+        pdf_file = _read_member(source, member) if member else source
+        found = extract_kv_from_pdf(pdf_file)
+        values = {k: found.get(k, {}).get("value") for k in LAB_COLUMNS}
+        if all(v is None for v in values.values()):
+            return name, values, "no lab values found", time.perf_counter() - started
+        return name, values, None, time.perf_counter() - started
+    except Exception as e:
+        return name, None, f"{type(e).__name__}: {e}", time.perf_counter() - started
+
+
+# ---- DATABASE ----
+
+def load_username_map(path):
+    """CSV with columns file,username (file matched by basename)."""
+    mapping = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            mapping[os.path.basename(row["file"])] = row["username"]
+    return mapping
+
+
+def upsert(db_path, df, username_map):
+    """Write clusters + lab values for files that map to an existing user. Returns (written, skipped_rows)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        known = {r[0] for r in conn.execute("SELECT username FROM users")}
+        rows, skipped = [], []
+        for record in df.to_dict("records"):
+            base = os.path.basename(record["file"])
+            username = username_map.get(base) if username_map else Path(base).stem
+            if username not in known:
+                skipped.append((record["file"], f"unknown user '{username}'"))
+                continue
+            rows.append((username, record))
+
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO user_profiles (username, cluster) VALUES (?, ?)
+                ON CONFLICT(username) DO UPDATE SET cluster = excluded.cluster
+                """,
+                [(u, r["cluster"]) for u, r in rows],
+            )
+            conn.executemany(
+                f"""
+                INSERT OR REPLACE INTO user_lab_values (username, {", ".join(LAB_COLUMNS)}, updated_at)
+                VALUES (?, {", ".join("?" for _ in LAB_COLUMNS)}, ?)
+                """,
+                [
+                    [u] + [None if pd.isna(r[c]) else float(r[c]) for c in LAB_COLUMNS] + [now]
+                    for u, r in rows
+                ],
+            )
+        return len(rows), skipped
+    finally:
+        conn.close()
+
+
+# ---- MAIN ----
+
+def run(args):
+    records, errors = [], []
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="bulk_ingest_") as workdir:
+        tasks = discover(args.source, workdir)
+        total = len(tasks)
+        if not total:
+            print("No PDFs found.")
+            return 1
+        print(f"Found {total} PDFs; extracting with {args.workers} workers...")
+
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(extract_one, task) for task in tasks]
+            for done, future in enumerate(as_completed(futures), start=1):
+                name, values, error, _ = future.result()
+                if values is not None and error is None:
+                    records.append({"file": name, **values})
+                else:
+                    errors.append((name, error))
+                if done % args.progress_every == 0 or done == total:
+                    elapsed = time.perf_counter() - started
+                    print(f"\r[{done}/{total}] {done / elapsed:,.1f} files/s, {len(errors)} errors",
+                          end="", flush=True)
+    print()
+    extract_s = time.perf_counter() - started
+
+    # One typed table: file name + float64 lab columns
+    df = pd.DataFrame.from_records(records, columns=["file"] + LAB_COLUMNS)
+    df[LAB_COLUMNS] = df[LAB_COLUMNS].astype("float64")
+    df = df.sort_values("file", ignore_index=True)
+
+    if not df.empty:
+        from ml_service import predictor
+        scored = time.perf_counter()
+        df["cluster"] = predictor.predict_batch(df[LAB_COLUMNS])
+        df["model_version"] = predictor.version
+        print(f"Scored {len(df)} rows in one batch ({time.perf_counter() - scored:.3f}s).")
+    else:
+        df["cluster"] = pd.Series(dtype="object")
+
+    if args.output.lower().endswith(".parquet"):
+        df.to_parquet(args.output, index=False)
+    else:
+        df.to_csv(args.output, index=False)
+    print(f"Wrote {len(df)} rows to {args.output}")
+
+    if args.upsert and not df.empty:
+        username_map = load_username_map(args.username_map) if args.username_map else None
+        written, skipped = upsert(args.db, df, username_map)
+        errors.extend(skipped)
+        print(f"Upserted {written} users into {args.db} ({len(skipped)} skipped).")
+
+    errors_path = args.errors or f"{os.path.splitext(args.output)[0]}.errors.csv"
+    with open(errors_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["file", "error"])
+        writer.writerows(errors)
+
+    total_s = time.perf_counter() - started
+    print(f"Done: {len(df)} ok, {len(errors)} errors (see {errors_path}). "
+          f"Extraction {extract_s:.1f}s ({total / extract_s:,.1f} files/s), total {total_s:.1f}s.")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract, score and optionally store a cohort of lab-report PDFs.")
+    parser.add_argument("source", help="Directory, .zip/.tar(.gz) archive or single PDF")
+    parser.add_argument("-o", "--output", default="cohort.csv", help="Output table (.csv or .parquet)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Extraction processes")
+    parser.add_argument("--errors", help="Per-file error report (default: <output>.errors.csv)")
+    parser.add_argument("--upsert", action="store_true", help="Write clusters and lab values to the database")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Database for --upsert (default: %(default)s)")
+    parser.add_argument("--username-map", help="CSV file,username; default maps <username>.pdf to username")
+    parser.add_argument("--progress-every", type=int, default=10, help="Progress line every N files")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
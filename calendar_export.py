@@ -0,0 +1,97 @@
+import io
+import csv
+import datetime
+
+ICS_PRODID = "-//WellnessAI//Recommended Events//EL"
+CSV_COLUMNS = ["date", "name", "address", "zip", "accessible", "priceless", "relevance_score", "text"]
+
+
+def _ics_escape(value) -> str:
+    text = "" if value is None else str(value)
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _ics_fold(line: str) -> str:
+    """Fold a content line at 75 octets (RFC 5545 §3.1), without splitting UTF-8 characters."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    current = ""
+    size = 0
+    limit = 75
+    for ch in line:
+        ch_size = len(ch.encode("utf-8"))
+        if size + ch_size > limit:
+            parts.append(current)
+            current, size, limit = "", 0, 74  # continuation lines start with a space
+        current += ch
+        size += ch_size
+    parts.append(current)
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _ics_dtstart(date_str):
+    """DTSTART property for a stored date ('YYYY-MM-DD' or 'YYYY-MM-DD HH:MM'); None if unparsable."""
+    if not date_str:
+        return None
+    for fmt, prop in (("%Y-%m-%d %H:%M", "DTSTART:{:%Y%m%dT%H%M%S}"), ("%Y-%m-%d", "DTSTART;VALUE=DATE:{:%Y%m%d}")):
+        try:
+            return prop.format(datetime.datetime.strptime(date_str, fmt))
+        except ValueError:
+            continue
+    return None
+
+
+def iter_ics(rows, username: str):
+    """Yield an iCalendar document chunk by chunk; rows are dicts with the event catalog columns (+ id, relevance_score)."""
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n"
+    yield _ics_fold(f"PRODID:{ICS_PRODID}")
+    yield "CALSCALE:GREGORIAN\r\nMETHOD:PUBLISH\r\n"
+    yield _ics_fold(f"X-WR-CALNAME:WellnessAI - {_ics_escape(username)}")
+
+    for row in rows:
+        dtstart = _ics_dtstart(row["date"])
+        if dtstart is None:
+            continue
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:event-{row['id']}@wellnessai",
+            f"DTSTAMP:{stamp}",
+            dtstart,
+            f"SUMMARY:{_ics_escape(row['name'] or 'Event')}",
+        ]
+        if row["text"]:
+            lines.append(f"DESCRIPTION:{_ics_escape(row['text'])}")
+        location = ", ".join(str(v) for v in (row["address"], row["zip"]) if v)
+        if location:
+            lines.append(f"LOCATION:{_ics_escape(location)}")
+        lines.append("END:VEVENT")
+        yield "".join(_ics_fold(line) for line in lines)
+
+    yield "END:VCALENDAR\r\n"
+
+
+def iter_csv(rows):
+    """Yield a CSV document row by row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return value
+
+    writer.writerow(CSV_COLUMNS)
+    yield flush()
+    for row in rows:
+        writer.writerow([row[col] for col in CSV_COLUMNS])
+        yield flush()
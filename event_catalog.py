@@ -0,0 +1,309 @@
+"""
+Shared, deduplicated event catalog.
+
+Every distinct event is stored once in `event_catalog`, keyed by a hash of its
+content; `user_events` links users to catalog entries and holds the per-user
+relevance score. `user_event_search` is an FTS5 index with one row per link,
+so a search only touches the searching user's events. Running this module
+migrates a database from the old per-user `events` table and reports the size
+before and after:
+
+    python event_catalog.py --db users.db
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import unicodedata
+
+DEFAULT_DB_PATH = os.environ.get("DB_PATH", "users.db")
+CATALOG_COLUMNS = ["name", "address", "zip", "accessible", "priceless", "date", "text"]
+SEARCH_COLUMNS = ["name", "text", "address"]
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS event_catalog (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        content_hash TEXT NOT NULL UNIQUE,
+        name TEXT,
+        address TEXT,
+        zip TEXT,
+        accessible TEXT,
+        priceless TEXT,
+        date TEXT,
+        text TEXT
+    )
+    """,
+    # id is the rowid of the link's row in user_event_search
+    """
+    CREATE TABLE IF NOT EXISTS user_events (
+        id INTEGER PRIMARY KEY,
+        username TEXT NOT NULL,
+        event_id INTEGER NOT NULL,
+        relevance_score REAL,
+        UNIQUE (username, event_id),
+        FOREIGN KEY(username) REFERENCES users(username),
+        FOREIGN KEY(event_id) REFERENCES event_catalog(id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_event_catalog_date ON event_catalog(date)",
+    "CREATE INDEX IF NOT EXISTS idx_user_events_event ON user_events(event_id)",
+]
+
+
+def ensure_schema(c):
+    for statement in SCHEMA:
+        c.execute(statement)
+    ensure_search_index(c)
+
+
+def content_hash(columns) -> str:
+    """Hash of the catalog columns (name, address, zip, accessible, priceless, date, text)."""
+    encoded = json.dumps(list(columns), ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def upsert_catalog_event(c, columns) -> int:
+    """Return the catalog id for these columns, inserting the event if it is new."""
+    digest = content_hash(columns)
+    c.execute(
+        f"""
+        INSERT OR IGNORE INTO event_catalog (content_hash, {", ".join(CATALOG_COLUMNS)})
+        VALUES (?, {", ".join("?" for _ in CATALOG_COLUMNS)})
+        """,
+        (digest, *columns),
+    )
+    if c.rowcount:
+        return c.lastrowid
+    return c.execute("SELECT id FROM event_catalog WHERE content_hash = ?", (digest,)).fetchone()[0]
+
+
+def link_user_event(c, username, event_id, relevance_score, columns):
+    """Link a catalog event (with its catalog columns) to a user, indexing it for that user's searches."""
+    row = c.execute(
+        "SELECT id FROM user_events WHERE username = ? AND event_id = ?", (username, event_id)
+    ).fetchone()
+    if row:
+        c.execute("UPDATE user_events SET relevance_score = ? WHERE id = ?", (relevance_score, row[0]))
+        return
+    c.execute(
+        "INSERT INTO user_events (username, event_id, relevance_score) VALUES (?, ?, ?)",
+        (username, event_id, relevance_score),
+    )
+    _index_link(c, c.lastrowid, username, dict(zip(CATALOG_COLUMNS, columns)))
+
+
+def unlink_user_events(c, username) -> list:
+    """Remove all of a user's links and return the catalog ids they pointed to."""
+    rows = c.execute(f"""
+        SELECT u.id, u.event_id, {", ".join("e." + col for col in SEARCH_COLUMNS)}
+        FROM user_events u JOIN event_catalog e ON e.id = u.event_id
+        WHERE u.username = ?
+    """, (username,)).fetchall()
+    for row in rows:
+        _index_link(c, row[0], username, dict(zip(SEARCH_COLUMNS, row[2:])), delete=True)
+    c.execute("DELETE FROM user_events WHERE username = ?", (username,))
+    return [row[1] for row in rows]
+
+
+def prune_catalog(c, event_ids=None) -> int:
+    """
+    Delete catalog entries no user links to any more (only among event_ids when
+    given, e.g. the ids a user was just unlinked from). Returns the number removed.
+    """
+    unlinked = "NOT EXISTS (SELECT 1 FROM user_events u WHERE u.event_id = event_catalog.id)"
+    if event_ids is None:
+        c.execute(f"DELETE FROM event_catalog WHERE {unlinked}")
+        return c.rowcount
+    removed = 0
+    for start in range(0, len(event_ids), 500):
+        batch = event_ids[start:start + 500]
+        c.execute(
+            f"DELETE FROM event_catalog WHERE id IN ({', '.join('?' for _ in batch)}) AND {unlinked}",
+            batch,
+        )
+        removed += c.rowcount
+    return removed
+
+
+# ---- FULL-TEXT SEARCH ----
+
+def normalize_search_text(value) -> str:
+    """Case-fold and strip accents; unicode61 keeps Greek tonos, so 'Γιόγκα' would not match 'γιογκα'."""
+    if value is None:
+        return ""
+    decomposed = unicodedata.normalize("NFD", str(value))
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def owner_token(username) -> str:
+    """Single-token stand-in for a username (usernames may contain separators the tokenizer splits on)."""
+    return "u" + hashlib.sha256(str(username).encode("utf-8")).hexdigest()[:16]
+
+
+def ensure_search_index(c):
+    """Create the FTS5 index (filled from the existing links) if it does not exist yet."""
+    exists = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_event_search'"
+    ).fetchone()
+    if exists:
+        return
+    # Contentless (the text lives in event_catalog only) and without token positions, which
+    # word/prefix queries never need; the owner column restricts a MATCH to one user's links,
+    # so its cost depends on that user's events rather than on the whole catalog.
+    c.execute(f"""
+        CREATE VIRTUAL TABLE user_event_search USING fts5(
+            owner, {", ".join(SEARCH_COLUMNS)}, content = '', detail = column,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+    """)
+    conn = getattr(c, "connection", c)
+    conn.create_function("search_fold", 1, normalize_search_text, deterministic=True)
+    conn.create_function("search_owner", 1, owner_token, deterministic=True)
+    c.execute(f"""
+        INSERT INTO user_event_search (rowid, owner, {", ".join(SEARCH_COLUMNS)})
+        SELECT u.id, search_owner(u.username), {", ".join(f"search_fold(e.{col})" for col in SEARCH_COLUMNS)}
+        FROM user_events u JOIN event_catalog e ON e.id = u.event_id
+    """)
+
+
+def _index_link(c, link_id, username, values, delete=False):
+    """Add a link to the index or, since it is contentless, remove it by repeating the indexed values."""
+    folded = [owner_token(username)] + [normalize_search_text(values[col]) for col in SEARCH_COLUMNS]
+    if delete:
+        c.execute(
+            f"INSERT INTO user_event_search (user_event_search, rowid, owner, {', '.join(SEARCH_COLUMNS)}) "
+            f"VALUES ('delete', ?, ?, ?, ?, ?)",
+            (link_id, *folded),
+        )
+    else:
+        c.execute(
+            f"INSERT INTO user_event_search (rowid, owner, {', '.join(SEARCH_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+            (link_id, *folded),
+        )
+
+
+def build_match_query(query: str):
+    """
+    Turn free text into an FTS5 expression over name/text/address: every word must match,
+    and a trailing '*' makes a word a prefix query ('γιογ*'). Returns None if there are no words.
+    Words are split like unicode61 splits them ('_' is a separator), since detail=column
+    rejects multi-token phrases.
+    """
+    terms = [f'"{word}"{star}' for word, star in re.findall(r"([^\W_]+)(\*?)", normalize_search_text(query))]
+    if not terms:
+        return None
+    return f"{{{' '.join(SEARCH_COLUMNS)}}} : ({' '.join(terms)})"
+
+
+def search_events(c, username, query, start=None, end=None, accessible=False, priceless=False, limit=20):
+    """Ranked search over one user's events; returns rows (with relevance_score) or None for an empty query."""
+    match = build_match_query(query)
+    if match is None:
+        return None
+    # Name hits weigh most, then address, then description
+    sql = """
+        SELECT e.id, e.name, e.date, e.text, e.address, e.zip, e.accessible, e.priceless,
+               u.relevance_score, bm25(user_event_search, 0.0, 10.0, 1.0, 3.0) AS rank
+        FROM user_event_search
+        JOIN user_events u ON u.id = user_event_search.rowid
+        JOIN event_catalog e ON e.id = u.event_id
+        WHERE user_event_search MATCH ?
+    """
+    params = [f'owner : "{owner_token(username)}" AND {match}']
+    if start:
+        sql += " AND e.date >= ?"
+        params.append(start)
+    if end:
+        sql += " AND e.date < ?"
+        params.append(end)
+    if accessible:
+        sql += " AND lower(e.accessible) IN ('yes', 'true')"
+    if priceless:
+        sql += " AND lower(e.priceless) IN ('yes', 'true')"
+    sql += " ORDER BY rank, u.relevance_score DESC LIMIT ?"
+    params.append(limit)
+    return c.execute(sql, params).fetchall()
+
+
+def migrate_legacy_events(conn, batch_size=1000):
+    """
+    Move rows from the old per-user `events` table into the catalog and drop it.
+    Idempotent: returns None when there is nothing to migrate.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'events'"
+    ).fetchone()
+    if not exists:
+        return None
+
+    ensure_schema(conn)
+    reader = conn.cursor()
+    writer = conn.cursor()
+    migrated = 0
+    with conn:
+        reader.execute(f"""
+            SELECT username, {", ".join(CATALOG_COLUMNS)}, relevance_score
+            FROM events ORDER BY id
+        """)
+        while True:
+            rows = reader.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                columns = tuple(row[1:8])
+                event_id = upsert_catalog_event(writer, columns)
+                link_user_event(writer, row[0], event_id, row[8], columns)
+            migrated += len(rows)
+        writer.execute("DROP TABLE events")
+
+    catalog = conn.execute("SELECT COUNT(*) FROM event_catalog").fetchone()[0]
+    links = conn.execute("SELECT COUNT(*) FROM user_events").fetchone()[0]
+    return {"migrated_rows": migrated, "catalog_events": catalog, "user_links": links}
+
+
+def db_size(conn) -> int:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    return page_size * page_count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate per-user events into the shared event catalog.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the database (default: %(default)s)")
+    parser.add_argument("--no-vacuum", action="store_true", help="Skip VACUUM (file size will not shrink)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"Database {args.db} not found.")
+        return 1
+
+    conn = sqlite3.connect(args.db)
+    try:
+        before = db_size(conn)
+        started = time.perf_counter()
+        stats = migrate_legacy_events(conn)
+        if stats is None:
+            print("No legacy `events` table found; nothing to migrate.")
+            return 0
+        if not args.no_vacuum:
+            conn.execute("VACUUM")
+        after = db_size(conn)
+    finally:
+        conn.close()
+
+    dedup = stats["migrated_rows"] / stats["catalog_events"] if stats["catalog_events"] else 0
+    print(f"Migrated {stats['migrated_rows']} event rows in {time.perf_counter() - started:.2f}s")
+    print(f"  catalog events: {stats['catalog_events']} ({dedup:.1f}x dedup), user links: {stats['user_links']}")
+    change = (after - before) / before * 100 if before else 0
+    print(f"  database size: {before / 1024:.1f} KiB -> {after / 1024:.1f} KiB ({change:+.1f}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
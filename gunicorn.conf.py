@@ -0,0 +1,25 @@
+# Picked up automatically by gunicorn when started from the project directory
+# (e.g. the Azure App Service default: `gunicorn app:app`).
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 600))
+
+# Import app.py (and load the ML model) once in the master before forking,
+# so workers share the model memory copy-on-write.
+preload_app = True
+
+# XGBoost's OpenMP thread pool does not survive fork(), so the preloading master
+# only loads the model artifacts (ml_service.preload_model) and never predicts.
+if preload_app:
+    os.environ["MODEL_DEFER_PREDICTIONS"] = "1"
+
+
+def post_fork(server, worker):
+    # Runs in each new worker: first prediction and the model hot-reload watcher
+    if server.cfg.preload_app:
+        from ml_service import predictor
+        predictor.warm_up()
+        predictor.start_watcher()
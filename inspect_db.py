@@ -1,50 +1,282 @@
-import sqlite3
+"""
+Inspect the application SQLite database without loading whole tables in memory.
+
+Examples:
+    python inspect_db.py                              # first 50 rows of every table
+    python inspect_db.py -t events --limit 100 --after 5000
+    python inspect_db.py -t events --export jsonl -o events.jsonl
+    python inspect_db.py --summary
+"""
+
 import os
+import sys
+import csv
+import json
+import sqlite3
+import argparse
+from itertools import chain, islice
+
+DEFAULT_DB_PATH = os.environ.get("DB_PATH", "users.db")
+FETCH_SIZE = 500
 
-db_path = 'users.db'
 
-if not os.path.exists(db_path):
-    print(f"Database {db_path} not found.")
-    exit()
+def quote_ident(name):
+    return '"' + name.replace('"', '""') + '"'
 
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
 
-def print_table(table_name):
-    print(f"\n--- Table: {table_name} ---")
+def list_tables(conn, include_shadow=False):
+    """
+    Table names, without FTS5 (and other virtual table) shadow tables such as
+    user_event_search_idx unless include_shadow is set.
+    """
     try:
-        cursor.execute(f"SELECT * FROM {table_name}")
-        columns = [description[0] for description in cursor.description]
-        rows = cursor.fetchall()
-        
-        if not rows:
-            print("(Empty)")
+        rows = conn.execute("SELECT name, type FROM pragma_table_list WHERE schema = 'main'").fetchall()
+    except sqlite3.OperationalError:  # SQLite < 3.37: no table_list, no shadow detection
+        rows = conn.execute("SELECT name, 'table' FROM sqlite_master WHERE type='table'").fetchall()
+    return sorted(
+        name for name, kind in rows
+        if not name.startswith("sqlite_") and kind != "view" and (include_shadow or kind != "shadow")
+    )
+
+
+def paging_key(conn, table):
+    """
+    Primary key columns of a WITHOUT ROWID table, which has no rowid to page by;
+    None for ordinary (rowid) tables.
+    """
+    (sql,) = conn.execute(
+        "SELECT COALESCE(sql, '') FROM sqlite_master WHERE type='table' AND name = ?", (table,)
+    ).fetchone() or ("",)
+    if "WITHOUT ROWID" not in " ".join(sql.upper().split()):
+        return None
+    pk = [(row[5], row[1]) for row in conn.execute(f"PRAGMA table_info({quote_ident(table)})") if row[5]]
+    return [name for _, name in sorted(pk)]
+
+
+def iter_rows(cursor, fetch_size=FETCH_SIZE):
+    """Stream rows from a cursor in fixed-size batches."""
+    while True:
+        batch = cursor.fetchmany(fetch_size)
+        if not batch:
             return
+        yield from batch
+
+
+def select_page(conn, table, limit=None, offset=0, after=None, key=None):
+    """
+    Open a cursor over one page of a table, ordered by rowid (first column _rowid),
+    or by the primary key columns `key` for WITHOUT ROWID tables (see paging_key).
+    `after` does keyset paging (key > after) and should be preferred over
+    `offset` on large tables, since OFFSET still walks the skipped rows.
+    """
+    if key is None:
+        sql = f"SELECT rowid AS _rowid, * FROM {quote_ident(table)}"
+        order_by = "rowid"
+    else:
+        sql = f"SELECT * FROM {quote_ident(table)}"
+        order_by = ", ".join(quote_ident(col) for col in key)
+    params = []
+    if after is not None:
+        if key is not None and len(key) > 1:
+            raise ValueError(f"--after needs a single-column key; {table} is keyed by ({order_by})")
+        sql += f" WHERE {order_by} > ?"
+        params.append(after if key is not None else int(after))
+    sql += f" ORDER BY {order_by}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+        if offset:
+            sql += " OFFSET ?"
+            params.append(offset)
+    elif offset:
+        sql += " LIMIT -1 OFFSET ?"
+        params.append(offset)
+    return conn.execute(sql, params)
+
+
+def _encode(val):
+    """Blobs as hex, so CSV/JSONL exports stay text (json.dumps cannot encode bytes)."""
+    if isinstance(val, bytes):
+        return val.hex()
+    raise TypeError(f"Object of type {type(val).__name__} is not JSON serializable")
+
+
+def _cell(val, width):
+    text = str(val).replace("\n", " ")
+    if len(text) > width:
+        text = text[: max(0, width - 1)] + "…"
+    return f"{text:<{width}}"
+
+
+def print_table(conn, table, limit, offset, after, width_sample, max_width):
+    print(f"\n--- Table: {table} ---")
+    key = paging_key(conn, table)
+    try:
+        cursor = select_page(conn, table, limit, offset, after, key)
+    except (sqlite3.OperationalError, ValueError) as e:
+        print(f"Error reading table {table}: {e}")
+        return
+
+    columns = [description[0] for description in cursor.description]
+    # Position of the value to resume after: _rowid, or a single-column primary key
+    key_index = 0 if key is None else (columns.index(key[0]) if len(key) == 1 else None)
+    rows = iter_rows(cursor)
+
+    # Widths come from a bounded sample; later rows are truncated to fit
+    sample = list(islice(rows, width_sample))
+    if not sample:
+        print("(Empty)")
+        return
+
+    widths = [len(c) for c in columns]
+    for row in sample:
+        for i, val in enumerate(row):
+            widths[i] = max(widths[i], len(str(val)))
+    widths = [min(w, max_width) for w in widths]
+
+    header = " | ".join(_cell(col, w) for col, w in zip(columns, widths))
+    print(header)
+    print("-" * len(header))
+
+    last_key = None
+    count = 0
+    for row in chain(sample, rows):
+        print(" | ".join(_cell(val, w) for val, w in zip(row, widths)))
+        last_key = row[key_index] if key_index is not None else None
+        count += 1
+
+    if limit is not None and count == limit:
+        if key_index is None:
+            print(f"... {count} rows shown. Next page: --table {table} --offset {offset + count}")
+        else:
+            print(f"... {count} rows shown. Next page: --table {table} --after {last_key}")
+
+
+def export_table(conn, table, fmt, out, limit, offset, after):
+    key = paging_key(conn, table)
+    cursor = select_page(conn, table, limit, offset, after, key)
+    skip = 1 if key is None else 0  # drop _rowid
+    columns = [description[0] for description in cursor.description][skip:]
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(["table"] + columns)
+        for row in iter_rows(cursor):
+            writer.writerow([table] + [val.hex() if isinstance(val, bytes) else val for val in row[skip:]])
+            count += 1
+    else:
+        for row in iter_rows(cursor):
+            record = {"table": table}
+            record.update(zip(columns, row[skip:]))
+            out.write(json.dumps(record, ensure_ascii=False, default=_encode) + "\n")
+            count += 1
+    print(f"[export] {table}: {count} rows", file=sys.stderr)
+
+
+def print_summary(conn, tables):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    print(f"Database: {page_count} pages x {page_size} B = {page_count * page_size / 1024:.1f} KiB "
+          f"({freelist} free pages)")
+
+    # Per-table/index page counts need the dbstat virtual table (not in every SQLite build)
+    pages = {}
+    try:
+        for name, n_pages in conn.execute("SELECT name, COUNT(*) FROM dbstat GROUP BY name"):
+            pages[name] = n_pages
+    except sqlite3.OperationalError:
+        pass
+
+    # sqlite_stat1 exists only after ANALYZE
+    stats = {}
+    try:
+        for tbl, idx, stat in conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1"):
+            stats[(tbl, idx)] = stat
+    except sqlite3.OperationalError:
+        pass
+
+    for table in tables:
+        (rows,) = conn.execute(f"SELECT COUNT(*) FROM {quote_ident(table)}").fetchone()
+        table_pages = pages.get(table)
+        print(f"\n--- Table: {table} ---")
+        print(f"rows: {rows}" + (f"  pages: {table_pages}" if table_pages is not None else ""))
+
+        indexes = conn.execute(f"PRAGMA index_list({quote_ident(table)})").fetchall()
+        if not indexes:
+            print("indexes: (none)")
+        for idx in indexes:
+            idx_name, unique, origin = idx[1], idx[2], idx[3]
+            cols = [c[2] for c in conn.execute(f"PRAGMA index_info({quote_ident(idx_name)})")]
+            line = f"index {idx_name} ({', '.join(str(c) for c in cols)})"
+            line += " unique" if unique else ""
+            line += f" origin={origin}"
+            if idx_name in pages:
+                line += f" pages={pages[idx_name]}"
+            if (table, idx_name) in stats:
+                line += f" stat1='{stats[(table, idx_name)]}'"
+            print(line)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Inspect the WellnessAI SQLite database.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the database (default: %(default)s)")
+    parser.add_argument("-t", "--table", action="append",
+                        help="Table to inspect (repeatable, default: all except FTS shadow tables)")
+    parser.add_argument("--limit", type=int,
+                        help="Max rows per table (default: 50 when printing, all when exporting; 0 = no limit)")
+    parser.add_argument("--offset", type=int, default=0, help="Rows to skip (prefer --after on large tables)")
+    parser.add_argument("--after", help="Keyset paging: only rows with rowid (or, for WITHOUT ROWID tables, "
+                                         "primary key) greater than this")
+    parser.add_argument("--width-sample", type=int, default=100, help="Rows sampled to size columns")
+    parser.add_argument("--max-width", type=int, default=40, help="Max printed column width")
+    parser.add_argument("--export", choices=["csv", "jsonl"], help="Stream rows as CSV/JSONL instead of a table")
+    parser.add_argument("-o", "--output", help="Export file (default: stdout)")
+    parser.add_argument("--summary", action="store_true", help="Only row counts, indexes and page statistics")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"Database {args.db} not found.")
+        return 1
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    try:
+        all_tables = list_tables(conn, include_shadow=True)
+        tables = args.table or list_tables(conn)
+        unknown = [t for t in tables if t not in all_tables]
+        if unknown:
+            print(f"Unknown table(s): {', '.join(unknown)}. Available: {', '.join(all_tables)}")
+            return 1
+
+        if args.limit is None:
+            limit = None if args.export else 50
+        else:
+            limit = args.limit or None
+
+        if args.summary:
+            print_summary(conn, tables)
+        elif args.export:
+            out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+            try:
+                for table in tables:
+                    export_table(conn, table, args.export, out, limit, args.offset, args.after)
+            except ValueError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return 1
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+        else:
+            for table in tables:
+                print_table(conn, table, limit, args.offset, args.after, args.width_sample, args.max_width)
+    finally:
+        conn.close()
+    return 0
 
-        # Calculate column widths
-        widths = [len(c) for c in columns]
-        for row in rows:
-            for i, val in enumerate(row):
-                widths[i] = max(widths[i], len(str(val)))
-        
-        # Print header
-        header = " | ".join(f"{col:<{w}}" for col, w in zip(columns, widths))
-        print(header)
-        print("-" * len(header))
-        
-        # Print rows
-        for row in rows:
-            print(" | ".join(f"{str(val):<{w}}" for val, w in zip(row, widths)))
-            
-    except sqlite3.OperationalError as e:
-        print(f"Error reading table {table_name}: {e}")
-
-# Get all tables
-cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-tables = cursor.fetchall()
-
-for table in tables:
-    print_table(table[0])
-
-conn.close()
 
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,40 +2,284 @@ import pandas as pd
 import joblib
 from xgboost import XGBClassifier
 import os
+import json
+import time
+import hashlib
+import datetime
+import threading
 
-# Paths to artifacts
+# Paths to artifacts (legacy layout: loose files in the working directory)
 MODEL_PATH = "xgb_lifestyle_model.json"
 ENCODER_PATH = "label_encoder.pkl"
 FEATURES_PATH = "feature_names.pkl"
 
+# Versioned layout: MODEL_DIR/<version>/{artifacts, manifest.json}, and
+# MODEL_DIR/CURRENT holding the version name that should be served.
+MODEL_DIR = os.environ.get("MODEL_DIR", "models")
+CURRENT_POINTER = "CURRENT"
+MANIFEST_NAME = "manifest.json"
+ARTIFACT_FILES = [MODEL_PATH, ENCODER_PATH, FEATURES_PATH]
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", 30))
+# Set by gunicorn.conf.py when the app is preloaded in the master, which then forks workers
+DEFER_PREDICTIONS = os.environ.get("MODEL_DEFER_PREDICTIONS", "0").lower() in ("1", "true", "yes")
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def write_bundle(model, label_encoder, feature_names, version: str = None, model_dir: str = MODEL_DIR,
+                 activate: bool = True) -> str:
+    """
+    Save trained artifacts as a versioned bundle with a checksummed manifest.
+    With activate=True the CURRENT pointer is switched atomically, which running
+    servers pick up through their model watcher.
+    """
+    version = version or datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    bundle_dir = os.path.join(model_dir, version)
+    os.makedirs(bundle_dir, exist_ok=False)
+
+    model.save_model(os.path.join(bundle_dir, MODEL_PATH))
+    joblib.dump(label_encoder, os.path.join(bundle_dir, ENCODER_PATH))
+    joblib.dump(feature_names, os.path.join(bundle_dir, FEATURES_PATH))
+
+    manifest = {
+        "version": version,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "files": {name: _sha256(os.path.join(bundle_dir, name)) for name in ARTIFACT_FILES},
+    }
+    with open(os.path.join(bundle_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    if activate:
+        tmp_pointer = os.path.join(model_dir, CURRENT_POINTER + ".tmp")
+        with open(tmp_pointer, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp_pointer, os.path.join(model_dir, CURRENT_POINTER))
+    return bundle_dir
+
+
+def resolve_current_bundle(model_dir: str = MODEL_DIR):
+    """Return (version, directory) of the bundle that should be served, or None for the legacy layout."""
+    pointer = os.path.join(model_dir, CURRENT_POINTER)
+    if os.path.exists(pointer):
+        with open(pointer, encoding="utf-8") as f:
+            version = f.read().strip()
+        if version:
+            return version, os.path.join(model_dir, version)
+
+    # No pointer: fall back to the newest bundle directory that has a manifest
+    if os.path.isdir(model_dir):
+        versions = sorted(
+            d for d in os.listdir(model_dir)
+            if os.path.exists(os.path.join(model_dir, d, MANIFEST_NAME))
+        )
+        if versions:
+            return versions[-1], os.path.join(model_dir, versions[-1])
+    return None
+
+
+class ModelBundle:
+    """One loaded model version. Never mutated after construction, so it can be swapped atomically."""
+
+    def __init__(self, version, model, label_encoder, feature_names, load_time_s):
+        self.version = version
+        self.model = model
+        self.label_encoder = label_encoder
+        self.feature_names = feature_names
+        self.load_time_s = load_time_s
+        self.loaded_at = datetime.datetime.now().isoformat(timespec="seconds")
+        self.model_bytes = len(model.get_booster().save_raw())
+
+    @classmethod
+    def load(cls, version, bundle_dir=None, smoke_test=True):
+        """
+        Load (and checksum-verify, for versioned bundles) the artifacts of one version.
+        smoke_test=False skips the test prediction, e.g. in a process that will fork.
+        """
+        started = time.perf_counter()
+        paths = {name: os.path.join(bundle_dir, name) if bundle_dir else name for name in ARTIFACT_FILES}
+
+        if bundle_dir:
+            with open(os.path.join(bundle_dir, MANIFEST_NAME), encoding="utf-8") as f:
+                manifest = json.load(f)
+            for name in ARTIFACT_FILES:
+                expected = manifest.get("files", {}).get(name)
+                if expected is None or _sha256(paths[name]) != expected:
+                    raise ValueError(f"Checksum mismatch for {name} in model {version}")
+
+        model = XGBClassifier()
+        model.load_model(paths[MODEL_PATH])
+        label_encoder = joblib.load(paths[ENCODER_PATH])
+        feature_names = joblib.load(paths[FEATURES_PATH])
+        bundle = cls(version, model, label_encoder, feature_names, time.perf_counter() - started)
+        if smoke_test:
+            bundle.smoke_test()
+        return bundle
+
+    def smoke_test(self):
+        """One prediction on an all-zero row; must decode to a known class."""
+        df_input = pd.DataFrame([{}]).reindex(columns=self.feature_names, fill_value=0)
+        label = self.label_encoder.inverse_transform(self.model.predict(df_input))[0]
+        if label not in set(self.label_encoder.classes_):
+            raise ValueError(f"Smoke prediction returned unknown label {label!r}")
+
+
 class LifestylePredictor:
     def __init__(self):
-        self.model = None
-        self.label_encoder = None
-        self.feature_names = None
-        self.is_loaded = False
-        
+        # Readers take one reference to the current bundle and use only that,
+        # so a hot swap never blocks them or mixes two versions in one prediction.
+        self.bundle = None
+        self.warmed_up = False
+        # Set in a process that will fork (the gunicorn master): XGBoost's OpenMP runtime
+        # is not fork-safe, so that process loads artifacts but never predicts.
+        self.defer_predictions = False
+        self.reloads = 0
+        self.last_reload_error = None
+        self._load_lock = threading.Lock()
+        self._watcher = None
+        self._watch_interval = None
+
+    # Flat attributes kept for existing callers
+    @property
+    def is_loaded(self) -> bool:
+        return self.bundle is not None
+
+    @property
+    def version(self):
+        bundle = self.bundle
+        return bundle.version if bundle else None
+
+    @property
+    def model(self):
+        bundle = self.bundle
+        return bundle.model if bundle else None
+
+    @property
+    def label_encoder(self):
+        bundle = self.bundle
+        return bundle.label_encoder if bundle else None
+
+    @property
+    def feature_names(self):
+        bundle = self.bundle
+        return bundle.feature_names if bundle else None
+
     def load_model(self):
-        """Loads the model artifacts if they exist."""
-        if not os.path.exists(MODEL_PATH) or \
-           not os.path.exists(ENCODER_PATH) or \
-           not os.path.exists(FEATURES_PATH):
-            print("ML artifacts not found. Please run the training script first.")
+        """Loads the model artifacts if they exist. Safe to call from several threads; loads once."""
+        if self.is_loaded:
+            return True
+
+        with self._load_lock:
+            if self.is_loaded:
+                return True
+
+            current = resolve_current_bundle()
+            if current is None and (not os.path.exists(MODEL_PATH) or
+                                    not os.path.exists(ENCODER_PATH) or
+                                    not os.path.exists(FEATURES_PATH)):
+                print("ML artifacts not found. Please run the training script first.")
+                return False
+
+            try:
+                smoke_test = not self.defer_predictions
+                self.bundle = (ModelBundle.load(*current, smoke_test=smoke_test) if current
+                               else ModelBundle.load("legacy", smoke_test=smoke_test))
+                print(f"Lifestyle model {self.bundle.version} loaded successfully "
+                      f"({self.bundle.load_time_s:.2f}s).")
+                return True
+            except Exception as e:
+                print(f"Error loading model: {e}")
+                return False
+
+    def reload_if_changed(self) -> bool:
+        """
+        Load the bundle CURRENT points to if it differs from the active one,
+        validate it, and swap it in. The old bundle keeps serving on any error.
+        """
+        current = resolve_current_bundle()
+        if current is None or current[0] == self.version:
             return False
 
-        try:
-            self.model = XGBClassifier()
-            self.model.load_model(MODEL_PATH)
-            
-            self.label_encoder = joblib.load(ENCODER_PATH)
-            self.feature_names = joblib.load(FEATURES_PATH)
-            
-            self.is_loaded = True
-            print("Lifestyle model loaded successfully.")
+        with self._load_lock:
+            if current[0] == self.version:
+                return False
+            try:
+                new_bundle = ModelBundle.load(*current, smoke_test=not self.defer_predictions)
+            except Exception as e:
+                self.last_reload_error = f"{current[0]}: {e}"
+                print(f"Model reload to {current[0]} rejected: {e}")
+                return False
+            old_version = self.version
+            self.bundle = new_bundle  # atomic reference swap
+            self.reloads += 1
+            self.last_reload_error = None
+            print(f"Lifestyle model hot-swapped: {old_version} -> {new_bundle.version}")
             return True
+
+    def start_watcher(self, interval: float = MODEL_WATCH_INTERVAL):
+        """Poll for a new CURRENT bundle in a daemon thread (restarted automatically in forked workers)."""
+        self._watch_interval = interval
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload_if_changed()
+                except Exception as e:
+                    print(f"Model watcher error: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def _after_fork(self):
+        # Threads do not survive fork(); each worker runs its own watcher
+        self._load_lock = threading.Lock()
+        self._watcher = None
+        self.defer_predictions = False
+        if self._watch_interval:
+            self.start_watcher(self._watch_interval)
+
+    def warm_up(self):
+        """
+        Smoke-test the loaded model with one throwaway prediction, so the first user
+        request does not pay for lazy init. Run it in each worker, after the fork.
+        """
+        if not self.load_model():
+            return False
+        bundle = self.bundle
+        try:
+            bundle.smoke_test()
         except Exception as e:
-            print(f"Error loading model: {e}")
+            print(f"Lifestyle model {bundle.version} failed its smoke test: {e}")
+            if self.bundle is bundle:
+                self.bundle = None
             return False
+        self.warmed_up = True
+        return True
+
+    def status(self) -> dict:
+        """Readiness info: active version, load time and memory footprint."""
+        bundle = self.bundle
+        return {
+            "loaded": bundle is not None,
+            "warmed_up": self.warmed_up,
+            "version": bundle.version if bundle else None,
+            "loaded_at": bundle.loaded_at if bundle else None,
+            "load_time_s": round(bundle.load_time_s, 3) if bundle else None,
+            "model_bytes": bundle.model_bytes if bundle else None,
+            "n_features": len(bundle.feature_names) if bundle else None,
+            "classes": list(bundle.label_encoder.classes_) if bundle else None,
+            "reloads": self.reloads,
+            "last_reload_error": self.last_reload_error,
+            "process_max_rss_kb": _max_rss_kb(),
+        }
 
     def predict(self, user_data: dict) -> str:
         """
@@ -45,6 +289,7 @@ class LifestylePredictor:
         if not self.is_loaded:
             if not self.load_model():
                 return "Unknown"
+        bundle = self.bundle
 
         try:
             # Convert input dict to DataFrame
@@ -55,13 +300,13 @@ class LifestylePredictor:
             # we need to ensure the input dataframe has EXACTLY those columns.
             
             # 1. Reindex to match training features (fills missing cols with 0)
-            df_input = df_input.reindex(columns=self.feature_names, fill_value=0)
+            df_input = df_input.reindex(columns=bundle.feature_names, fill_value=0)
             
             # 2. Predict
-            y_pred_encoded = self.model.predict(df_input)
+            y_pred_encoded = bundle.model.predict(df_input)
             
             # 3. Decode label
-            cluster_name = self.label_encoder.inverse_transform(y_pred_encoded)[0]
+            cluster_name = bundle.label_encoder.inverse_transform(y_pred_encoded)[0]
             
             return cluster_name
             
@@ -69,10 +314,53 @@ class LifestylePredictor:
             print(f"Prediction error: {e}")
             return "Unknown"
 
+    def predict_batch(self, df: pd.DataFrame) -> list:
+        """
+        Vectorized version of predict: one model call for a whole DataFrame of users.
+        Returns a list of cluster names aligned with df's rows ('Unknown' for all if the model is missing).
+        """
+        if not self.is_loaded:
+            if not self.load_model():
+                return ["Unknown"] * len(df)
+        if df.empty:
+            return []
+        bundle = self.bundle
+
+        df_input = df.reindex(columns=bundle.feature_names, fill_value=0)
+        # XGBoost rejects object columns (e.g. all-None ones), so coerce everything to numbers first
+        object_columns = df_input.columns[df_input.dtypes == object]
+        if len(object_columns):
+            df_input[object_columns] = df_input[object_columns].apply(pd.to_numeric, errors="coerce")
+        y_pred_encoded = bundle.model.predict(df_input)
+        return list(bundle.label_encoder.inverse_transform(y_pred_encoded))
+
+def _max_rss_kb():
+    """Peak resident set size of this process (KiB on Linux); None where `resource` is missing (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
 # Singleton instance
 predictor = LifestylePredictor()
+os.register_at_fork(after_in_child=predictor._after_fork)
 
 def predict_user_cluster(user_data: dict) -> str:
     """Wrapper function to use easily in app.py"""
     return predictor.predict(user_data)
 
+def preload_model() -> bool:
+    """
+    Load + warm up the singleton at startup. In a gunicorn master that will fork
+    (MODEL_DEFER_PREDICTIONS) only the artifacts are loaded; each worker then
+    warms up in post_fork (gunicorn.conf.py).
+    """
+    predictor.defer_predictions = DEFER_PREDICTIONS
+    if DEFER_PREDICTIONS:
+        return predictor.load_model()
+    return predictor.warm_up()
+
+def model_version():
+    """Version of the model currently serving predictions (None if not loaded)."""
+    return predictor.version
@@ -0,0 +1,152 @@
+import os
+import re
+import time
+import json
+import random
+import pstats
+import cProfile
+import functools
+import threading
+from pathlib import Path
+from flask import request, session, g
+
+# ---- CONFIG ----
+# Profiling is off unless PROFILING_ENABLED is set. Once enabled, a request is
+# profiled either by random sampling or when it carries the trusted header.
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0.0"))
+PROFILE_HEADER = "X-Profile-Token"
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", "profiles"))
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "50"))
+
+
+class RequestProfiler:
+    """
+    Per-request cProfile hook for a Flask app.
+    Each profiled request is dumped as a pstats file (loadable with snakeviz,
+    flameprof or `python -m pstats`) plus a small JSON sidecar with the route,
+    user and duration. Only the newest `max_files` dumps are kept.
+
+    cProfile only sees the request thread. Work the request hands to a thread
+    pool is profiled by submitting `profiler.task(fn)` instead of `fn`; it is
+    dumped as its own file, tagged with the request's route and the task name.
+    """
+
+    def __init__(self, app=None, enabled=PROFILING_ENABLED, sample_rate=PROFILE_SAMPLE_RATE,
+                 token=PROFILE_TOKEN, profile_dir=PROFILE_DIR, max_files=PROFILE_MAX_FILES):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.token = token
+        self.profile_dir = Path(profile_dir)
+        self.max_files = max_files
+        # cProfile can only have one active profiler per process on newer
+        # Pythons, so concurrent requests skip profiling instead of failing.
+        self._active = threading.Lock()
+        self._rotate_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.teardown_request(self._stop)
+
+    def _should_profile(self) -> bool:
+        if not self.enabled:
+            return False
+        if self.token and request.headers.get(PROFILE_HEADER) == self.token:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _start(self):
+        if not self._should_profile():
+            return
+        if not self._active.acquire(blocking=False):
+            return
+        profiler = cProfile.Profile()
+        g._profiler = profiler
+        g._profile_started = time.perf_counter()
+        profiler.enable()
+
+    def _stop(self, exc=None):
+        profiler = g.pop("_profiler", None)
+        if profiler is None:
+            return
+        profiler.disable()
+        duration_ms = (time.perf_counter() - g.pop("_profile_started")) * 1000
+        self._active.release()
+
+        try:
+            self._dump(profiler, duration_ms, exc, self._request_meta())
+        except Exception as e:
+            print(f"[profiling] Failed to write profile: {e}")
+
+    def task(self, fn):
+        """
+        Wrap fn before submitting it to a thread pool: if the current request is
+        being profiled, fn is profiled in the pool thread too. Otherwise fn is returned as is.
+        """
+        if g.get("_profiler") is None:
+            return fn
+        meta = dict(self._request_meta(), task=getattr(fn, "__name__", repr(fn)))
+
+        @functools.wraps(fn)
+        def profiled(*args, **kwargs):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # another profiler is active (Python 3.12+ allows one per process)
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            exc = None
+            try:
+                return fn(*args, **kwargs)
+            except BaseException as e:
+                exc = e
+                raise
+            finally:
+                profiler.disable()
+                try:
+                    self._dump(profiler, (time.perf_counter() - started) * 1000, exc, meta)
+                except Exception as e:
+                    print(f"[profiling] Failed to write task profile: {e}")
+
+        return profiled
+
+    @staticmethod
+    def _request_meta() -> dict:
+        return {
+            "route": request.url_rule.rule if request.url_rule else request.path,
+            "method": request.method,
+            "path": request.path,
+            "user": session.get("user") or "anonymous",
+        }
+
+    def _dump(self, profiler, duration_ms, exc, meta):
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", meta["route"]).strip("_") or "root"
+        if meta.get("task"):
+            slug += f"_{meta['task']}"
+        stem = f"{time.strftime('%Y%m%d-%H%M%S')}_{int(time.time() * 1000) % 1000:03d}_{slug}_{duration_ms:.0f}ms"
+
+        stats = pstats.Stats(profiler)
+        stats.dump_stats(str(self.profile_dir / f"{stem}.prof"))
+
+        meta = dict(
+            meta,
+            duration_ms=round(duration_ms, 2),
+            error=repr(exc) if exc else None,
+            timestamp=time.time(),
+        )
+        with open(self.profile_dir / f"{stem}.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+        self._rotate()
+
+    def _rotate(self):
+        with self._rotate_lock:
+            dumps = sorted(self.profile_dir.glob("*.prof"), key=lambda p: p.stat().st_mtime)
+            for old in dumps[:max(0, len(dumps) - self.max_files)]:
+                old.unlink(missing_ok=True)
+                old.with_suffix(".json").unlink(missing_ok=True)
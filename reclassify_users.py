@@ -0,0 +1,170 @@
+"""
+Re-classify every stored user after a model update.
+
+Streams users and their stored lab values (user_lab_values) out of SQLite in
+chunks, scores each chunk with one vectorized XGBoost call and writes the
+changed clusters back in a single transaction per chunk. Progress is
+checkpointed in the same transaction, so an interrupted run resumes where it
+stopped.
+
+Examples:
+    python reclassify_users.py
+    python reclassify_users.py --chunk-size 5000 --job-id retrain-2025-06
+    python reclassify_users.py --restart --dry-run
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import datetime
+
+import pandas as pd
+
+from ml_service import predictor
+
+DEFAULT_DB_PATH = os.environ.get("DB_PATH", "users.db")
+LAB_COLUMNS = ["Age", "BMI", "Chol", "HDL", "LDL", "TG", "Cr", "BUN"]
+
+
+def ensure_jobs_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reclassify_jobs (
+            job_id TEXT PRIMARY KEY,
+            last_username TEXT,
+            processed INTEGER DEFAULT 0,
+            changed INTEGER DEFAULT 0,
+            started_at TEXT,
+            finished_at TEXT
+        )
+    """)
+    conn.commit()
+
+
+def load_checkpoint(conn, job_id, restart):
+    if restart:
+        conn.execute("DELETE FROM reclassify_jobs WHERE job_id = ?", (job_id,))
+    row = conn.execute(
+        "SELECT last_username, processed, changed, finished_at FROM reclassify_jobs WHERE job_id = ?",
+        (job_id,),
+    ).fetchone()
+    if row is None:
+        conn.execute(
+            "INSERT INTO reclassify_jobs (job_id, last_username, started_at) VALUES (?, '', ?)",
+            (job_id, datetime.datetime.now().isoformat(timespec="seconds")),
+        )
+        conn.commit()
+        return "", 0, 0, None
+    conn.commit()
+    return row
+
+
+def iter_chunks(conn, after, chunk_size):
+    """Keyset-paginate users that have lab values, yielding one DataFrame per chunk."""
+    sql = f"""
+        SELECT l.username, p.cluster, {", ".join("l." + c for c in LAB_COLUMNS)}
+        FROM user_lab_values l
+        JOIN user_profiles p ON p.username = l.username
+        WHERE l.username > ?
+        ORDER BY l.username
+        LIMIT ?
+    """
+    while True:
+        # A column that is NULL in every row of a chunk would otherwise come back as object dtype
+        chunk = pd.read_sql_query(sql, conn, params=(after, chunk_size),
+                                  dtype={c: "float64" for c in LAB_COLUMNS})
+        if chunk.empty:
+            return
+        yield chunk
+        after = chunk["username"].iloc[-1]
+
+
+def run(db_path, chunk_size, job_id, restart=False, dry_run=False):
+    if not predictor.load_model():
+        print("Model could not be loaded; aborting.")
+        return 1
+    # One checkpoint per model version, so a new model always triggers a full pass
+    job_id = job_id or f"model-{predictor.version}"
+    print(f"Scoring with model version {predictor.version}")
+
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_jobs_table(conn)
+        after, processed, changed, finished_at = load_checkpoint(conn, job_id, restart)
+        if finished_at and not restart:
+            print(f"Job '{job_id}' already finished at {finished_at} "
+                  f"({processed} users, {changed} changed). Use --restart to run it again.")
+            return 0
+        if after:
+            print(f"Resuming job '{job_id}' after '{after}' ({processed} users done, {changed} changed).")
+
+        started = time.perf_counter()
+        run_processed = 0
+        transitions = {}
+
+        for chunk in iter_chunks(conn, after, chunk_size):
+            new_clusters = predictor.predict_batch(chunk[LAB_COLUMNS])
+            chunk["new_cluster"] = new_clusters
+            diff = chunk[chunk["cluster"] != chunk["new_cluster"]]
+
+            for old, new in zip(diff["cluster"], diff["new_cluster"]):
+                transitions[(old, new)] = transitions.get((old, new), 0) + 1
+
+            last = chunk["username"].iloc[-1]
+            processed += len(chunk)
+            changed += len(diff)
+            run_processed += len(chunk)
+
+            if not dry_run:
+                # Cluster updates + checkpoint commit together, so a crash never skips or repeats work
+                with conn:
+                    conn.executemany(
+                        "UPDATE user_profiles SET cluster = ? WHERE username = ?",
+                        list(zip(diff["new_cluster"], diff["username"])),
+                    )
+                    conn.execute(
+                        "UPDATE reclassify_jobs SET last_username = ?, processed = ?, changed = ? WHERE job_id = ?",
+                        (last, processed, changed, job_id),
+                    )
+
+            elapsed = time.perf_counter() - started
+            rate = run_processed / elapsed if elapsed > 0 else float("inf")
+            print(f"[{job_id}] {processed} users scored, {changed} changed ({rate:,.0f} users/s)")
+
+        if not dry_run:
+            with conn:
+                conn.execute(
+                    "UPDATE reclassify_jobs SET finished_at = ? WHERE job_id = ?",
+                    (datetime.datetime.now().isoformat(timespec="seconds"), job_id),
+                )
+
+        elapsed = time.perf_counter() - started
+        print(f"\nDone{' (dry run, no clusters updated)' if dry_run else ''}: "
+              f"{run_processed} users in {elapsed:.2f}s "
+              f"({run_processed / elapsed if elapsed > 0 else 0:,.0f} users/s), "
+              f"{changed} clusters changed in total.")
+        for (old, new), count in sorted(transitions.items(), key=lambda kv: -kv[1]):
+            print(f"  {old} -> {new}: {count}")
+    finally:
+        conn.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-classify all stored users with the current model.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the database (default: %(default)s)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Users scored per model call")
+    parser.add_argument("--job-id", help="Checkpoint name; reuse it to resume (default: model-<active version>)")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint for this job id")
+    parser.add_argument("--dry-run", action="store_true", help="Score and report without updating any clusters")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"Database {args.db} not found.")
+        return 1
+    return run(args.db, args.chunk_size, args.job_id, args.restart, args.dry_run)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
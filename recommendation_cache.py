@@ -0,0 +1,132 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Callable, Optional
+
+AGE_BUCKET_YEARS = 5
+
+
+def _sorted_list(value) -> list:
+    if not value:
+        return []
+    items = value.split(",") if isinstance(value, str) else list(value)
+    return sorted({str(i).strip().casefold() for i in items if str(i).strip()})
+
+
+def profile_fingerprint(json_data: dict) -> str:
+    """
+    Canonical fingerprint of the events workflow input, ignoring the username.
+    Age is bucketed and condition/interest lists are order-insensitive, so
+    equivalent profiles share one cache entry.
+    """
+    age = json_data.get("age")
+    canonical = {
+        "age_bucket": (int(age) // AGE_BUCKET_YEARS) * AGE_BUCKET_YEARS if age is not None else None,
+        "gender": (json_data.get("gender") or "").strip().casefold(),
+        "city": (json_data.get("city") or "").strip().casefold(),
+        "condition_type": _sorted_list(json_data.get("condition_type")),
+        "interests": _sorted_list(json_data.get("interests")),
+    }
+    encoded = json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class RecommendationCache:
+    """
+    SQLite-backed cache of events workflow results keyed by profile fingerprint.
+    Entries expire after `ttl_seconds`; once more than `max_entries` are stored
+    the least recently used ones are evicted.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], ttl_seconds: float = 24 * 3600,
+                 max_entries: int = 5000):
+        self.connect = connect
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, fingerprint: str) -> Optional[dict]:
+        now = time.time()
+        conn = self.connect()
+        try:
+            row = conn.execute(
+                "SELECT result, created_at FROM recommendation_cache WHERE fingerprint = ?",
+                (fingerprint,),
+            ).fetchone()
+            if row is None:
+                self._count(False)
+                return None
+            if now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM recommendation_cache WHERE fingerprint = ?", (fingerprint,))
+                conn.commit()
+                self._count(False)
+                return None
+            conn.execute(
+                "UPDATE recommendation_cache SET last_used_at = ?, hits = hits + 1 WHERE fingerprint = ?",
+                (now, fingerprint),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        self._count(True)
+        return json.loads(row[0])
+
+    def put(self, fingerprint: str, result: dict):
+        if not result or not result.get("recommended_events"):
+            return
+        now = time.time()
+        conn = self.connect()
+        try:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO recommendation_cache (fingerprint, result, created_at, last_used_at, hits)
+                VALUES (?, ?, ?, ?, 0)
+                """,
+                (fingerprint, json.dumps(result, ensure_ascii=False), now, now),
+            )
+            conn.execute("DELETE FROM recommendation_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            (count,) = conn.execute("SELECT COUNT(*) FROM recommendation_cache").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    """
+                    DELETE FROM recommendation_cache WHERE fingerprint IN (
+                        SELECT fingerprint FROM recommendation_cache ORDER BY last_used_at ASC LIMIT ?
+                    )
+                    """,
+                    (count - self.max_entries,),
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        conn = self.connect()
+        try:
+            entries, stored_hits = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM recommendation_cache"
+            ).fetchone()
+        finally:
+            conn.close()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+            "entries": entries,
+            "stored_entry_hits": stored_hits,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries,
+        }
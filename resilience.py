@@ -0,0 +1,325 @@
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Optional
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend the circuit breaker considers unhealthy."""
+
+
+class DeadlineExceeded(RuntimeError):
+    """Raised when a call (including its retries and hedges) runs out of time."""
+
+
+# =========================
+# Building blocks
+# =========================
+
+class Deadline:
+    """Absolute time budget for one logical call."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+class RetryBudget:
+    """
+    Token bucket that caps retries to a fraction of recent traffic, so retries
+    cannot multiply load on a backend that is already struggling.
+    Every request deposits `ratio` tokens; every retry withdraws one.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 0.5, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._last) * self.min_per_second)
+        self._last = now
+
+    def record_request(self):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._refill()
+            return {"tokens": round(self._tokens, 2), "ratio": self.ratio, "max_tokens": self.max_tokens}
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies, used to pick the hedge delay."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+    def snapshot(self) -> dict:
+        p50 = self.percentile(0.50)
+        p95 = self.percentile(0.95)
+        with self._lock:
+            count = len(self._samples)
+        return {
+            "samples": count,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half_open after `reset_timeout` seconds (one trial call allowed);
+    half_open -> closed on success, back to open on failure.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    self.rejected += 1
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "rejected": self.rejected,
+                "retry_in_s": retry_in,
+            }
+
+
+# =========================
+# Guarded endpoint
+# =========================
+
+class ResilientEndpoint:
+    """
+    Wraps calls to one remote API with a deadline, a circuit breaker, optional
+    retries (idempotent calls only, limited by a retry budget, jittered
+    exponential backoff) and optional hedging after the observed p95 latency.
+
+    `fn(timeout)` performs one attempt and returns a response object;
+    responses with status >= 500 (or 429) count as failures.
+
+    Hedged calls run on a thread pool of `max_workers` threads, and each can hold
+    two of them (primary + hedge); size it for every thread that may call at once,
+    or calls queue for a thread while their deadlines run out.
+    """
+
+    def __init__(self, name: str, deadline: float, breaker: Optional[CircuitBreaker] = None,
+                 retry_budget: Optional[RetryBudget] = None, max_attempts: int = 3,
+                 backoff_base: float = 0.2, backoff_cap: float = 5.0,
+                 hedge_min_delay: float = 0.5, max_workers: int = 8):
+        self.name = name
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_budget = retry_budget or RetryBudget()
+        self.latency = LatencyTracker()
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge_min_delay = hedge_min_delay
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"hedge-{name}")
+        self._stats_lock = threading.Lock()
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+                      "failures": 0, "deadline_exceeded": 0, "short_circuited": 0}
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    @staticmethod
+    def _is_failure(resp: Any) -> bool:
+        status = getattr(resp, "status_code", None)
+        return status is not None and (status >= 500 or status == 429)
+
+    def _attempt(self, fn: Callable[[float], Any], deadline: Deadline) -> Any:
+        # Check the deadline first: in half_open, allow() takes the single trial
+        # slot, and only record_success/record_failure give it back.
+        if deadline.expired():
+            raise DeadlineExceeded(f"Langflow {self.name} call exceeded its {deadline.seconds:.0f}s deadline")
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError(
+                f"Langflow {self.name} API is unavailable (circuit open), try again later."
+            )
+        timeout = deadline.remaining()
+        self._count("attempts")
+        started = time.monotonic()
+        try:
+            resp = fn(timeout)
+        except BaseException:
+            self.breaker.record_failure()
+            raise
+        if self._is_failure(resp):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+            self.latency.record(time.monotonic() - started)
+        return resp
+
+    def _hedged_attempt(self, fn: Callable[[float], Any], deadline: Deadline) -> Any:
+        p95 = self.latency.percentile(0.95)
+        delay = max(self.hedge_min_delay, p95) if p95 is not None else None
+        primary = self._pool.submit(self._attempt, fn, deadline)
+        if delay is None or delay >= deadline.remaining():
+            return primary.result()
+
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        self._count("hedges")
+        hedge = self._pool.submit(self._attempt, fn, deadline)
+        pending = {primary, hedge}
+        last_exc = None
+        while pending:
+            done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for fut in done:
+                try:
+                    resp = fut.result()
+                except Exception as e:
+                    last_exc = e
+                    continue
+                if not self._is_failure(resp) or not pending:
+                    if fut is hedge:
+                        self._count("hedge_wins")
+                    return resp
+        if last_exc is not None:
+            raise last_exc
+        raise DeadlineExceeded(f"Langflow {self.name} call exceeded its {deadline.seconds:.0f}s deadline")
+
+    def call(self, fn: Callable[[float], Any], idempotent: bool = False, hedge: bool = False,
+             deadline: Optional[float] = None) -> Any:
+        """
+        Run fn under this endpoint's policies and return its response.
+        deadline (seconds) replaces the endpoint's default; a spent budget (<= 0) fails at once.
+        """
+        seconds = self.deadline if deadline is None else deadline
+        self._count("calls")
+        if seconds <= 0:
+            self._count("deadline_exceeded")
+            raise DeadlineExceeded(f"Langflow {self.name} call has no time left in its deadline")
+        dl = Deadline(seconds)
+        self.retry_budget.record_request()
+
+        attempts = self.max_attempts if idempotent else 1
+        last_resp, last_exc = None, None
+        for attempt in range(1, attempts + 1):
+            try:
+                resp = self._hedged_attempt(fn, dl) if hedge else self._attempt(fn, dl)
+                if not self._is_failure(resp):
+                    return resp
+                self._count("failures")
+                last_resp, last_exc = resp, None
+            except CircuitOpenError:
+                raise
+            except DeadlineExceeded:
+                self._count("deadline_exceeded")
+                raise
+            except Exception as e:
+                self._count("failures")
+                last_resp, last_exc = None, e
+
+            if attempt == attempts:
+                break
+            # Retry only while both the retry budget and the deadline allow it
+            backoff = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** (attempt - 1))))
+            if backoff >= dl.remaining() or not self.retry_budget.try_spend():
+                break
+            self._count("retries")
+            time.sleep(backoff)
+
+        if last_exc is not None:
+            raise last_exc
+        return last_resp
+
+    def snapshot(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {
+            "deadline_s": self.deadline,
+            "breaker": self.breaker.snapshot(),
+            "retry_budget": self.retry_budget.snapshot(),
+            "latency": self.latency.snapshot(),
+            "stats": stats,
+        }
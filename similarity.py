@@ -0,0 +1,137 @@
+"""
+"Users like me": nearest reference profiles for a set of lab values.
+
+Builds a KD-tree once over the standardized lab features of the reference
+dataset (clustered_with_labels.csv) and answers k-nearest-neighbour queries
+for pdf_to_df rows, returning each neighbour's lifestyle cluster and interest.
+"""
+
+import os
+import time
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+REFERENCE_CSV = os.environ.get("SIMILARITY_REFERENCE_CSV", "clustered_with_labels.csv")
+FEATURES = ["Age", "BMI", "Chol", "TG", "HDL", "LDL", "Cr", "BUN"]
+PROFILE_COLUMNS = {"lifestyle_cluster": "cluster", "Interest": "interest", "Age": "age", "Gender": "gender", "Πόλη": "city"}
+
+
+class SimilarityIndex:
+    """k-nearest reference profiles in z-scored feature space. Immutable once built, so safe to share."""
+
+    def __init__(self, csv_path: str = REFERENCE_CSV, leaf_size: int = 30):
+        self.csv_path = csv_path
+        self.leaf_size = leaf_size
+        self.tree = None
+        self.mean = None
+        self.scale = None
+        self.profiles = None
+        self.build_time_s = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.tree is not None
+
+    def load(self) -> bool:
+        """Read the reference dataset and build the tree (once; safe to call from several threads)."""
+        if self.is_loaded:
+            return True
+
+        with self._lock:
+            if self.is_loaded:
+                return True
+            if not os.path.exists(self.csv_path):
+                print(f"Similarity reference dataset {self.csv_path} not found.")
+                return False
+
+            try:
+                started = time.perf_counter()
+                df = pd.read_csv(self.csv_path)
+                X = df[FEATURES].apply(pd.to_numeric, errors="coerce").astype("float64")
+                mean = X.mean().to_numpy()
+                scale = X.std(ddof=0).replace(0, 1).to_numpy()
+                # Missing reference values sit at the mean (0 after scaling), as missing query values do
+                standardized = np.nan_to_num((X.to_numpy() - mean) / scale, nan=0.0)
+
+                profiles = df.reindex(columns=list(PROFILE_COLUMNS)).rename(columns=PROFILE_COLUMNS)
+                self.profiles = profiles.astype(object).where(profiles.notna(), None).to_dict("records")
+                self.mean, self.scale = mean, scale
+                self.tree = KDTree(standardized, leaf_size=self.leaf_size)
+                self.build_time_s = time.perf_counter() - started
+                print(f"Similarity index built over {len(standardized)} profiles ({self.build_time_s:.2f}s).")
+                return True
+            except Exception as e:
+                print(f"Error building similarity index: {e}")
+                return False
+
+    def transform(self, df: pd.DataFrame) -> np.ndarray:
+        """Standardize rows with the reference statistics; missing or non-numeric values become 0 (the mean)."""
+        X = df.reindex(columns=FEATURES)
+        try:
+            X = X.to_numpy(dtype="float64")
+        except (TypeError, ValueError):
+            X = X.apply(pd.to_numeric, errors="coerce").to_numpy(dtype="float64")
+        return self._standardize(X)
+
+    def _standardize(self, X: np.ndarray) -> np.ndarray:
+        return np.nan_to_num((X - self.mean) / self.scale, nan=0.0)
+
+    def _query(self, X: np.ndarray, k: int) -> list:
+        k = max(1, min(k, len(self.profiles)))
+        distances, indices = self.tree.query(X, k=k)
+        return [
+            [dict(self.profiles[i], distance=round(float(d), 4)) for d, i in zip(row_d, row_i)]
+            for row_d, row_i in zip(distances, indices)
+        ]
+
+    def neighbors_batch(self, df: pd.DataFrame, k: int = 5) -> list:
+        """
+        Nearest reference profiles for every row of df (e.g. pdf_to_df output), in one tree query.
+        Returns one list per row of dicts (cluster, interest, age, gender, city, distance), closest first.
+        """
+        if not self.load():
+            return [[] for _ in range(len(df))]
+        if df.empty:
+            return []
+        return self._query(self.transform(df), k)
+
+    def neighbors(self, features, k: int = 5) -> list:
+        """Nearest reference profiles for one row (a dict of lab values or a one-row DataFrame)."""
+        if isinstance(features, pd.DataFrame):
+            return (self.neighbors_batch(features.head(1), k) or [[]])[0]
+        if not self.load():
+            return []
+        # Plain dicts skip the DataFrame round trip, which costs more than the tree query itself
+        row = np.array([[_as_float(features.get(f)) for f in FEATURES]])
+        return self._query(self._standardize(row), k)[0]
+
+    def status(self) -> dict:
+        return {
+            "loaded": self.is_loaded,
+            "profiles": len(self.profiles) if self.profiles is not None else 0,
+            "build_time_s": round(self.build_time_s, 3) if self.build_time_s is not None else None,
+        }
+
+
+def _as_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def summarize(neighbours: list) -> dict:
+    """Cluster and interest counts across a neighbour list (most common first)."""
+    return {
+        "clusters": Counter(n["cluster"] for n in neighbours if n["cluster"]).most_common(),
+        "interests": Counter(n["interest"] for n in neighbours if n["interest"]).most_common(),
+    }
+
+
+# Singleton instance
+similarity_index = SimilarityIndex()
@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Callable, Tuple
+
+
+def workflow_key(username: str, workflow_type: str, payload: Any) -> str:
+    """Stable key for (username, workflow type, payload hash)."""
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    return f"{username}:{workflow_type}:{digest}"
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key so the work runs once and every
+    caller receives its result.
+
+    Within a process, followers block on the leader's threading.Event.
+    Across processes (prefork workers), the leader holds a lease row in the
+    `workflow_runs` table; followers in other processes poll that row until the
+    result is written. While fn runs, the leader renews the lease (heartbeat_at)
+    every lease_seconds / 3, so a long run keeps it; a lease not renewed for
+    `lease_seconds` is considered abandoned (crashed worker) and can be taken over.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], lease_seconds: float = 30,
+                 poll_interval: float = 0.25, retention_seconds: float = 60):
+        self.connect = connect
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = lease_seconds / 3
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def in_flight(self, key: str) -> bool:
+        """True if this process is currently running `key`."""
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn() once per in-flight key.
+        Returns (result, shared) where shared is True if another caller did the work.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            result, shared = self._do_across_processes(key, fn)
+            call.result = result
+            return result, shared
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    # ---- cross-process layer (SQLite lease) ----
+
+    def _do_across_processes(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        while True:
+            if self._try_acquire(key, owner):
+                break
+            outcome = self._wait_for(key)
+            if outcome is not None:
+                status, payload = outcome
+                if status == "error":
+                    raise RuntimeError(payload)
+                return json.loads(payload) if payload else None, True
+            # Lease expired without a result: loop and try to take over
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(key, owner, stop), name=f"singleflight-lease-{key[:32]}", daemon=True
+        )
+        heartbeat.start()
+        try:
+            result = fn()
+        except Exception as e:
+            self._finish(key, owner, "error", str(e))
+            raise
+        finally:
+            stop.set()
+        self._finish(key, owner, "done", json.dumps(result, ensure_ascii=False, default=str))
+        return result, False
+
+    def _heartbeat(self, key: str, owner: str, stop: threading.Event):
+        """Renew the lease until stop is set or the lease is no longer ours."""
+        while not stop.wait(self.heartbeat_interval):
+            try:
+                conn = self.connect()
+                try:
+                    cursor = conn.execute(
+                        """
+                        UPDATE workflow_runs SET heartbeat_at = ?
+                        WHERE key = ? AND owner = ? AND status = 'running'
+                        """,
+                        (time.time(), key, owner),
+                    )
+                    conn.commit()
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                # e.g. database locked: the next beat retries well before the lease runs out
+                print(f"Lease renewal failed for {key}: {e}")
+                continue
+            if cursor.rowcount == 0:
+                return
+
+    def _try_acquire(self, key: str, owner: str) -> bool:
+        now = time.time()
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "DELETE FROM workflow_runs WHERE status != 'running' AND finished_at < ?",
+                (now - self.retention_seconds,),
+            )
+            row = conn.execute(
+                "SELECT status, COALESCE(heartbeat_at, started_at) FROM workflow_runs WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[0] == "running" and now - row[1] < self.lease_seconds:
+                conn.commit()
+                return False
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO workflow_runs
+                    (key, status, owner, result, started_at, heartbeat_at, finished_at)
+                VALUES (?, 'running', ?, NULL, ?, ?, NULL)
+                """,
+                (key, owner, now, now),
+            )
+            conn.commit()
+            return True
+        finally:
+            conn.close()
+
+    def _wait_for(self, key: str):
+        """Poll until the running lease for key finishes. Returns (status, result) or None if it expired."""
+        while True:
+            conn = self.connect()
+            try:
+                row = conn.execute(
+                    "SELECT status, result, COALESCE(heartbeat_at, started_at) FROM workflow_runs WHERE key = ?",
+                    (key,),
+                ).fetchone()
+            finally:
+                conn.close()
+            if row is None:
+                return None
+            status, result, renewed_at = row[0], row[1], row[2]
+            if status != "running":
+                return status, result
+            if time.time() - renewed_at >= self.lease_seconds:
+                return None
+            time.sleep(self.poll_interval)
+
+    def _finish(self, key: str, owner: str, status: str, result: str):
+        conn = self.connect()
+        try:
+            conn.execute(
+                """
+                UPDATE workflow_runs SET status = ?, result = ?, finished_at = ?
+                WHERE key = ? AND owner = ?
+                """,
+                (status, result, time.time(), key, owner),
+            )
+            conn.commit()
+        finally:
+            conn.close()
@@ -0,0 +1,170 @@
+import json
+import time
+import uuid
+import sqlite3
+from typing import Callable
+
+
+class RunSuperseded(Exception):
+    """A newer run was started for the same key; the old one must stop writing."""
+
+
+class RunBroadcaster:
+    """
+    Fan-out of streamed workflow results, keyed by username, through the
+    `stream_runs` / `stream_run_items` tables so that any worker process can
+    serve a run another worker is producing. Each run keeps the items
+    published so far, so a browser that connects late (e.g. right after the
+    redirect, possibly to another worker) first replays them and then
+    follows the live run until it finishes.
+
+    Followers poll the database every `poll_interval` seconds. Each open
+    stream holds one server thread for its whole duration, so size the
+    worker threads (GUNICORN_THREADS) for the expected number of viewers.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], keep_finished_seconds: float = 300,
+                 abandon_seconds: float = 3600, poll_interval: float = 0.5):
+        self.connect = connect
+        self.keep_finished_seconds = keep_finished_seconds
+        self.abandon_seconds = abandon_seconds
+        self.poll_interval = poll_interval
+
+    def start(self, key):
+        """Begin a new run for key; get(key) returns it from now on."""
+        run_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self.connect()
+        try:
+            with conn:
+                self._prune(conn, now)
+                conn.execute(
+                    "INSERT INTO stream_runs (run_id, key, started_at) VALUES (?, ?, ?)", (run_id, key, now)
+                )
+        finally:
+            conn.close()
+        return _Run(self, run_id, key)
+
+    def get(self, key):
+        """The latest run for key (running or recently finished), or None."""
+        conn = self.connect()
+        try:
+            row = conn.execute(
+                "SELECT run_id FROM stream_runs WHERE key = ? ORDER BY started_at DESC LIMIT 1", (key,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return _Run(self, row[0], key) if row else None
+
+    def _prune(self, conn, now):
+        # Finished runs after keep_finished_seconds; unfinished ones are from a crashed worker
+        stale = """
+            SELECT run_id FROM stream_runs
+            WHERE finished_at < ? OR (finished_at IS NULL AND started_at < ?)
+        """
+        params = (now - self.keep_finished_seconds, now - self.abandon_seconds)
+        conn.execute(f"DELETE FROM stream_run_items WHERE run_id IN ({stale})", params)
+        conn.execute(f"DELETE FROM stream_runs WHERE run_id IN ({stale})", params)
+
+
+class _Run:
+    def __init__(self, broadcaster, run_id, key):
+        self._broadcaster = broadcaster
+        self.run_id = run_id
+        self.key = key
+
+    def is_current(self, conn) -> bool:
+        """
+        True while this is still the latest run for its key. Check it inside the
+        write transaction (BEGIN IMMEDIATE) that it guards, so a run started
+        concurrently cannot slip in between the check and the write.
+        """
+        row = conn.execute(
+            "SELECT run_id FROM stream_runs WHERE key = ? ORDER BY started_at DESC LIMIT 1", (self.key,)
+        ).fetchone()
+        return row is not None and row[0] == self.run_id
+
+    def _state(self, conn):
+        """(finished, error); a pruned run counts as finished."""
+        row = conn.execute(
+            "SELECT finished_at, error FROM stream_runs WHERE run_id = ?", (self.run_id,)
+        ).fetchone()
+        if row is None:
+            return True, None
+        return row[0] is not None, row[1]
+
+    @property
+    def done(self) -> bool:
+        conn = self._broadcaster.connect()
+        try:
+            return self._state(conn)[0]
+        finally:
+            conn.close()
+
+    def publish(self, item):
+        conn = self._broadcaster.connect()
+        try:
+            with conn:
+                conn.execute(
+                    """
+                    INSERT INTO stream_run_items (run_id, seq, data)
+                    SELECT ?, COALESCE(MAX(seq), 0) + 1, ? FROM stream_run_items WHERE run_id = ?
+                    """,
+                    (self.run_id, json.dumps(item, ensure_ascii=False, default=str), self.run_id),
+                )
+        finally:
+            conn.close()
+
+    def finish(self, error=None):
+        conn = self._broadcaster.connect()
+        try:
+            with conn:
+                conn.execute(
+                    "UPDATE stream_runs SET finished_at = ?, error = ? WHERE run_id = ?",
+                    (time.time(), error, self.run_id),
+                )
+        finally:
+            conn.close()
+
+    def follow(self, heartbeat: float = 15.0):
+        """
+        Yield ("item", data) for every published item (replay + live), ("ping", None)
+        every `heartbeat` seconds of silence, and a final ("done", error) once finished.
+        """
+        seq = 0
+        last_sent = time.monotonic()
+        while True:
+            conn = self._broadcaster.connect()
+            try:
+                # State first: items published before the run finished are then all visible below
+                done, error = self._state(conn)
+                rows = conn.execute(
+                    "SELECT seq, data FROM stream_run_items WHERE run_id = ? AND seq > ? ORDER BY seq",
+                    (self.run_id, seq),
+                ).fetchall()
+            finally:
+                conn.close()
+
+            for row_seq, data in rows:
+                seq = row_seq
+                yield "item", json.loads(data)
+            if done:
+                yield "done", error
+                return
+            if rows:
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= heartbeat:
+                last_sent = time.monotonic()
+                yield "ping", None
+            time.sleep(self._broadcaster.poll_interval)
+
+
+def sse_format(data=None, event=None) -> str:
+    """Encode one Server-Sent Events message (a comment line when data is None)."""
+    if data is None and event is None:
+        return ": ping\n\n"
+    out = ""
+    if event:
+        out += f"event: {event}\n"
+    out += f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return out
@@ -0,0 +1,190 @@
+import time
+import threading
+
+import pytest
+
+from resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceeded, ResilientEndpoint, RetryBudget,
+)
+
+
+class Resp:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self.body = body
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+# ---- CircuitBreaker ----
+
+def test_breaker_opens_after_threshold_and_rejects():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot()["rejected"] == 1
+
+
+def test_half_open_allows_one_trial_then_closes_on_success():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    open_breaker(breaker)
+    time.sleep(0.02)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # trial already in flight
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_half_open_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0.01)
+    open_breaker(breaker)
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+# ---- ResilientEndpoint ----
+
+def test_expired_deadline_in_half_open_does_not_take_trial_slot():
+    ep = ResilientEndpoint("test", deadline=5, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.01))
+    open_breaker(ep.breaker)
+    time.sleep(0.02)
+
+    with pytest.raises(DeadlineExceeded):
+        ep.call(lambda timeout: Resp(), deadline=1e-9)
+
+    # A healthy backend must still get its trial call and close the circuit
+    assert ep.call(lambda timeout: Resp(body="ok")).body == "ok"
+    assert ep.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_spent_caller_deadline_fails_fast():
+    ep = ResilientEndpoint("test", deadline=5)
+    calls = []
+    for spent in (0.0, -1.0):
+        with pytest.raises(DeadlineExceeded):
+            ep.call(lambda timeout: calls.append(timeout) or Resp(), deadline=spent)
+    assert calls == []
+    assert ep.stats["deadline_exceeded"] == 2
+
+
+def test_caller_deadline_replaces_default():
+    ep = ResilientEndpoint("test", deadline=60)
+    timeouts = []
+    ep.call(lambda timeout: timeouts.append(timeout) or Resp(), deadline=0.5)
+    assert 0 < timeouts[0] <= 0.5
+
+
+def test_open_circuit_short_circuits_without_calling():
+    ep = ResilientEndpoint("test", deadline=5, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    open_breaker(ep.breaker)
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        ep.call(lambda timeout: calls.append(timeout) or Resp(), idempotent=True)
+    assert calls == []
+    assert ep.stats["short_circuited"] == 1
+
+
+def test_exception_in_half_open_trial_reopens():
+    ep = ResilientEndpoint("test", deadline=5, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.01))
+    open_breaker(ep.breaker)
+    time.sleep(0.02)
+
+    def boom(timeout):
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        ep.call(boom)
+    assert ep.breaker.state == CircuitBreaker.OPEN
+
+
+def test_retries_idempotent_calls_until_success():
+    ep = ResilientEndpoint("test", deadline=5, backoff_base=0.001)
+    statuses = iter([503, 502, 200])
+    resp = ep.call(lambda timeout: Resp(next(statuses)), idempotent=True)
+    assert resp.status_code == 200
+    assert ep.stats["attempts"] == 3
+    assert ep.stats["retries"] == 2
+
+
+def test_non_idempotent_calls_are_not_retried():
+    ep = ResilientEndpoint("test", deadline=5, backoff_base=0.001)
+    resp = ep.call(lambda timeout: Resp(503))
+    assert resp.status_code == 503
+    assert ep.stats["attempts"] == 1
+
+
+def test_retry_budget_exhaustion_stops_retries():
+    budget = RetryBudget(ratio=0.0, min_per_second=0.0, max_tokens=1.0)
+    ep = ResilientEndpoint("test", deadline=5, retry_budget=budget, max_attempts=5, backoff_base=0.001,
+                           breaker=CircuitBreaker(failure_threshold=100))
+
+    first = ep.call(lambda timeout: Resp(503), idempotent=True)
+    assert first.status_code == 503
+    assert ep.stats["attempts"] == 2  # the single budget token paid for one retry
+
+    ep.call(lambda timeout: Resp(503), idempotent=True)
+    assert ep.stats["attempts"] == 3  # budget empty: no retry at all
+    assert budget.snapshot()["tokens"] == 0
+
+
+def test_hedge_wins_when_primary_is_slow():
+    ep = ResilientEndpoint("test", deadline=5, hedge_min_delay=0.05)
+    for _ in range(20):
+        ep.latency.record(0.01)
+    release = threading.Event()
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            release.wait(2)  # primary stalls
+            return Resp(body="primary")
+        return Resp(body="hedge")
+
+    try:
+        resp = ep.call(fn, hedge=True)
+    finally:
+        release.set()
+    assert resp.body == "hedge"
+    assert ep.stats["hedges"] == 1
+    assert ep.stats["hedge_wins"] == 1
+
+
+def test_no_hedge_when_primary_is_fast():
+    ep = ResilientEndpoint("test", deadline=5, hedge_min_delay=0.2)
+    for _ in range(20):
+        ep.latency.record(0.01)
+    resp = ep.call(lambda timeout: Resp(body="primary"), hedge=True)
+    assert resp.body == "primary"
+    assert ep.stats["hedges"] == 0
+
+
+def test_hedged_call_hits_deadline():
+    ep = ResilientEndpoint("test", deadline=0.2, hedge_min_delay=0.05)
+    for _ in range(20):
+        ep.latency.record(0.01)
+    release = threading.Event()
+
+    def stall(timeout):
+        release.wait(2)
+        return Resp()
+
+    try:
+        with pytest.raises(DeadlineExceeded):
+            ep.call(stall, hedge=True)
+    finally:
+        release.set()
+    assert ep.stats["deadline_exceeded"] == 1
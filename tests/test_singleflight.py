@@ -0,0 +1,197 @@
+import time
+import sqlite3
+import threading
+
+import pytest
+
+from singleflight import SingleFlight, workflow_key
+
+
+@pytest.fixture
+def connect(tmp_path):
+    path = tmp_path / "singleflight.db"
+
+    def _connect():
+        return sqlite3.connect(str(path), timeout=5)
+
+    conn = _connect()
+    conn.execute("""
+        CREATE TABLE workflow_runs (
+            key TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            owner TEXT,
+            result TEXT,
+            started_at REAL,
+            heartbeat_at REAL,
+            finished_at REAL
+        )
+    """)
+    conn.commit()
+    conn.close()
+    return _connect
+
+
+def lease_row(connect, key):
+    conn = connect()
+    try:
+        return conn.execute(
+            "SELECT status, owner, started_at, heartbeat_at FROM workflow_runs WHERE key = ?", (key,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+def test_workflow_key_ignores_payload_key_order():
+    assert workflow_key("bob", "events", {"a": 1, "b": 2}) == workflow_key("bob", "events", {"b": 2, "a": 1})
+    assert workflow_key("bob", "events", {"a": 1}) != workflow_key("alice", "events", {"a": 1})
+
+
+# ---- lease acquisition ----
+
+def test_acquire_is_exclusive_while_lease_is_fresh(connect):
+    sf = SingleFlight(connect, lease_seconds=60)
+    assert sf._try_acquire("k", "owner-1")
+    assert not sf._try_acquire("k", "owner-2")
+    assert lease_row(connect, "k")[:2] == ("running", "owner-1")
+
+
+def test_expired_lease_can_be_taken_over(connect):
+    sf = SingleFlight(connect, lease_seconds=0.05)
+    assert sf._try_acquire("k", "crashed-worker")
+    time.sleep(0.1)
+    assert sf._try_acquire("k", "owner-2")
+    assert lease_row(connect, "k")[:2] == ("running", "owner-2")
+
+
+def test_finished_run_is_not_a_lease(connect):
+    sf = SingleFlight(connect, lease_seconds=60)
+    assert sf.do("k", lambda: {"n": 1}) == ({"n": 1}, False)
+    assert lease_row(connect, "k")[0] == "done"
+    assert sf._try_acquire("k", "owner-2")
+
+
+def test_waiter_gives_up_on_expired_lease_and_takes_over(connect):
+    leader = SingleFlight(connect, lease_seconds=0.2, poll_interval=0.02)
+    # A lease that is never renewed, like one left behind by a crashed worker
+    assert leader._try_acquire("k", "crashed-worker")
+
+    other = SingleFlight(connect, lease_seconds=0.2, poll_interval=0.02)
+    started = time.monotonic()
+    result, shared = other.do("k", lambda: "rerun")
+    assert (result, shared) == ("rerun", False)
+    assert time.monotonic() - started >= 0.15
+
+
+# ---- followers ----
+
+def test_waiter_in_another_process_receives_leaders_result(connect):
+    # Two instances share only the database, like two gunicorn workers
+    leader, follower = (SingleFlight(connect, lease_seconds=5, poll_interval=0.02) for _ in range(2))
+    runs = []
+    entered = threading.Event()
+
+    def work():
+        runs.append(1)
+        entered.set()
+        time.sleep(0.2)
+        return {"events": [1, 2]}
+
+    out = {}
+    t = threading.Thread(target=lambda: out.update(leader=leader.do("k", work)))
+    t.start()
+    entered.wait(2)
+    out["follower"] = follower.do("k", work)
+    t.join()
+
+    assert runs == [1]
+    assert out["leader"] == ({"events": [1, 2]}, False)
+    assert out["follower"] == ({"events": [1, 2]}, True)
+
+
+def test_waiter_in_another_process_receives_leaders_error(connect):
+    leader, follower = (SingleFlight(connect, lease_seconds=5, poll_interval=0.02) for _ in range(2))
+    entered = threading.Event()
+
+    def fail():
+        entered.set()
+        time.sleep(0.1)
+        raise ValueError("langflow down")
+
+    errors = []
+
+    def lead():
+        try:
+            leader.do("k", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    t = threading.Thread(target=lead)
+    t.start()
+    entered.wait(2)
+    with pytest.raises(RuntimeError, match="langflow down"):
+        follower.do("k", fail)
+    t.join()
+    assert len(errors) == 1
+
+
+def test_threads_in_one_process_share_one_call(connect):
+    sf = SingleFlight(connect, lease_seconds=5)
+    runs = []
+    gate = threading.Event()
+
+    def work():
+        runs.append(1)
+        gate.wait(2)
+        return "shared"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(sf.do("k", work))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    assert sf.in_flight("k")
+    gate.set()
+    for t in threads:
+        t.join()
+
+    assert runs == [1]
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert not sf.in_flight("k")
+
+
+# ---- heartbeat ----
+
+def test_heartbeat_keeps_a_long_run_from_being_taken_over(connect):
+    leader, other = (SingleFlight(connect, lease_seconds=0.3, poll_interval=0.02) for _ in range(2))
+    runs = []
+    entered = threading.Event()
+
+    def slow():
+        runs.append(1)
+        entered.set()
+        time.sleep(1.0)  # several lease lengths
+        return "slow"
+
+    out = {}
+    t = threading.Thread(target=lambda: out.update(leader=leader.do("k", slow)))
+    t.start()
+    entered.wait(2)
+    out["other"] = other.do("k", slow)
+    t.join()
+
+    assert runs == [1]
+    assert out["other"] == ("slow", True)
+
+
+def test_heartbeat_renews_the_lease(connect):
+    sf = SingleFlight(connect, lease_seconds=0.15)
+    seen = {}
+
+    def work():
+        seen["first"] = lease_row(connect, "k")[3]
+        time.sleep(0.3)
+        seen["later"] = lease_row(connect, "k")[3]
+        return None
+
+    sf.do("k", work)
+    assert seen["later"] > seen["first"]
@@ -95,4 +95,10 @@ feature_names = X_train.columns.tolist()
 joblib.dump(feature_names, "feature_names.pkl")
 print("- Feature Names saved: feature_names.pkl")
 
-print("\nDone! Copy these 3 files to your backend application folder.")
+# 4. Versioned bundle (artifacts + checksummed manifest) picked up by running servers
+from ml_service import write_bundle
+bundle_dir = write_bundle(model, label_encoder, feature_names)
+print(f"- Versioned bundle saved and activated: {bundle_dir}")
+
+print("\nDone! Running servers hot-reload the new bundle from models/CURRENT;")
+print("the 3 loose files above are only used when no models/ directory exists.")